@@ -1,9 +1,14 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Body
+import base64
+import json
+from typing import List, Literal
+from fastapi import APIRouter, Depends, HTTPException, Body, Query
 from pydantic import BaseModel
 from datetime import datetime
 
 from middleware import get_admin_user
+from auth import invalidate_user_tokens
+from cache import cache_stats
+from executors import executor_stats
 import database
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
@@ -23,36 +28,73 @@ class UserAdminResponse(BaseModel):
     created_at: datetime
     last_login: datetime | None
 
+class UserListResponse(BaseModel):
+    users: List[UserAdminResponse]
+    next_cursor: str | None
+
 class AdminStatsResponse(BaseModel):
     total_users: int
     total_blogs: int
     total_videos: int
     total_images: int
 
-@router.get("/users", response_model=List[UserAdminResponse])
-async def list_users(admin_user: dict = Depends(get_admin_user)):
-    """List all registered users. Admin only."""
-    pool = await database.get_pool()
-    async with pool.acquire() as conn:
-        rows = await conn.fetch("SELECT * FROM users ORDER BY created_at DESC")
-        return [dict(row) for row in rows]
+class UsageBucket(BaseModel):
+    bucket: datetime
+    endpoint: str
+    tier: str
+    count: int
+
+def _encode_cursor(user: dict) -> str:
+    payload = json.dumps([user["created_at"].isoformat(), user["id"]])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        created_at, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), str(user_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/users", response_model=UserListResponse)
+async def list_users(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    tier: Literal["free", "pro", "business"] | None = None,
+    role: Literal["user", "admin"] | None = None,
+    is_active: bool | None = None,
+    email_prefix: str | None = Query(None, max_length=254),
+    admin_user: dict = Depends(get_admin_user),
+):
+    """
+    List registered users, newest first, one page at a time. Admin only.
+
+    Pass the returned `next_cursor` back as `cursor` to fetch the next page;
+    it is null on the last page.
+    """
+    after = _decode_cursor(cursor) if cursor else None
+    # Fetch one extra row to learn whether another page exists
+    users = await database.list_users_page(
+        limit + 1, after, tier=tier, role=role, is_active=is_active, email_prefix=email_prefix
+    )
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = _encode_cursor(users[-1])
+    return {"users": users, "next_cursor": next_cursor}
 
 @router.get("/stats", response_model=AdminStatsResponse)
 async def get_stats(admin_user: dict = Depends(get_admin_user)):
     """Get platform-wide generation stats. Admin only."""
-    pool = await database.get_pool()
-    async with pool.acquire() as conn:
-        users_count = await conn.fetchval("SELECT COUNT(*) FROM users")
-        blogs_count = await conn.fetchval("SELECT COUNT(*) FROM usage_logs WHERE endpoint = 'generate-blog'")
-        videos_count = await conn.fetchval("SELECT COUNT(*) FROM usage_logs WHERE endpoint = 'generate-video-script'")
-        images_count = await conn.fetchval("SELECT COUNT(*) FROM usage_logs WHERE endpoint = 'generate-image'")
-            
-        return AdminStatsResponse(
-            total_users=users_count,
-            total_blogs=blogs_count,
-            total_videos=videos_count,
-            total_images=images_count
-        )
+    return AdminStatsResponse(**await database.get_platform_stats())
+
+@router.get("/stats/timeseries", response_model=List[UsageBucket])
+async def get_stats_timeseries(
+    bucket: Literal["hour", "day"] = "day",
+    days: int = Query(7, ge=1, le=90),
+    admin_user: dict = Depends(get_admin_user),
+):
+    """Generation counts per hour or day, broken down by endpoint and tier. Admin only."""
+    return await database.get_usage_timeseries(bucket, days)
 
 @router.put("/users/{user_id}")
 async def update_user(user_id: str, request: UserUpdateRequest, admin_user: dict = Depends(get_admin_user)):
@@ -62,11 +104,29 @@ async def update_user(user_id: str, request: UserUpdateRequest, admin_user: dict
     if request.role not in ["user", "admin"]:
         raise HTTPException(status_code=400, detail="Invalid role")
         
-    pool = await database.get_pool()
-    async with pool.acquire() as conn:
+    async with database.acquire() as conn:
         await conn.execute(
             "UPDATE users SET tier = $1, role = $2, is_active = $3 WHERE id = $4", 
             request.tier, request.role, request.is_active, user_id
         )
+    database.invalidate_user(user_id)
+    if not request.is_active:
+        # Force the next request with any of their tokens through full verification
+        invalidate_user_tokens(user_id)
         
     return {"message": "User updated successfully"}
+
+@router.get("/cache-stats")
+async def get_cache_stats(admin_user: dict = Depends(get_admin_user)):
+    """Hit/miss counters for the application caches. Admin only."""
+    return cache_stats()
+
+@router.get("/pool-stats")
+async def get_pool_stats(admin_user: dict = Depends(get_admin_user)):
+    """Database pool occupancy and connection wait times. Admin only."""
+    return database.pool_stats()
+
+@router.get("/executor-stats")
+async def get_executor_stats(admin_user: dict = Depends(get_admin_user)):
+    """Queue depth and throughput of the CPU-bound worker pools. Admin only."""
+    return executor_stats()
@@ -1,38 +1,117 @@
+import hashlib
 import os
+import time
+import uuid
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
-from passlib.context import CryptContext
-from jose import JWTError, jwt
-from config import JWT_SECRET, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
+from config import (
+    JWT_SECRET,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    REFRESH_TOKEN_EXPIRE_DAYS,
+    BCRYPT_ROUNDS,
+    AUTH_EXECUTOR_WORKERS,
+    AUTH_EXECUTOR_MAX_PENDING,
+    AUTH_EXECUTOR_PROCESSES,
+    TOKEN_CACHE_SIZE,
+    TOKEN_CACHE_MIN_TTL,
+)
+from cache import TTLCache, register_cache
+from executors import BoundedExecutor
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# passlib and jose are imported on first use to keep them off the cold-start path
+
+@lru_cache(maxsize=1)
+def get_pwd_context():
+    from passlib.context import CryptContext
+
+    # Hashes below BCRYPT_ROUNDS are flagged by verify_and_update for rehashing
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+    )
+
+# bcrypt takes 100ms+ per call, so it never runs on the event loop
+password_executor = BoundedExecutor(
+    "password",
+    max_workers=AUTH_EXECUTOR_WORKERS,
+    max_pending=AUTH_EXECUTOR_MAX_PENDING,
+    use_processes=AUTH_EXECUTOR_PROCESSES,
+)
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+def _verify_and_update(plain_password, hashed_password):
+    return get_pwd_context().verify_and_update(plain_password, hashed_password)
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password in the password executor. Raises ExecutorBusy when saturated."""
+    return await password_executor.run(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verify a password in the password executor.
+
+    Returns (valid, new_hash); new_hash is set when the stored hash uses
+    fewer rounds than BCRYPT_ROUNDS and should be replaced. Raises
+    ExecutorBusy when saturated.
+    """
+    return await password_executor.run(_verify_and_update, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "type": "access"})
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=ALGORITHM)
     return encoded_jwt
 
 def create_refresh_token(data: dict):
+    from jose import jwt
+
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire})
+    # jti identifies the token so it can be used exactly once (see /auth/refresh)
+    to_encode.update({"exp": expire, "type": "refresh", "jti": str(uuid.uuid4())})
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=ALGORITHM)
     return encoded_jwt
 
+# Verified claims keyed by token digest; each entry expires before its token does
+_token_cache = register_cache(
+    "jwt_claims",
+    TTLCache(TOKEN_CACHE_SIZE, ACCESS_TOKEN_EXPIRE_MINUTES * 60),
+)
+
 def decode_token(token: str):
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = _token_cache.get(digest)
+    if payload is not None and payload["exp"] > time.time():
+        return dict(payload)
+
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         return None
+
+    # Tokens close to expiry are not worth caching, nor are one-time refresh tokens
+    remaining = payload.get("exp", 0) - time.time()
+    if remaining > TOKEN_CACHE_MIN_TTL and payload.get("type") != "refresh":
+        _token_cache.set(digest, payload, ttl=remaining - TOKEN_CACHE_MIN_TTL)
+    return dict(payload)
+
+def invalidate_user_tokens(user_id: str) -> int:
+    """Drop cached claims for every token issued to `user_id`."""
+    return _token_cache.discard_where(lambda _, claims: claims.get("sub") == user_id)
@@ -4,33 +4,17 @@ Prism AI — Blog Generation Module
 Generates SEO-optimized blog articles using the Groq LLM.
 """
 
-import asyncio
 import logging
+from typing import AsyncIterator
 
-from config import DEFAULT_LLM_MODEL, get_groq_client
+from config import DEFAULT_LLM_MODEL, get_async_groq_client
+from tracing import span
 
 logger = logging.getLogger("prism.blog")
 
 
-async def generate_blog(
-    product_name: str,
-    tone: str,
-    word_count: int,
-    model: str = DEFAULT_LLM_MODEL,
-) -> dict:
-    """
-    Generate an SEO-optimized blog article for a product using Groq API.
-
-    Args:
-        product_name: Name of the product to write about
-        tone:         Writing tone (e.g., Professional, Casual, Informative)
-        word_count:   Approximate word count
-        model:        LLM model identifier
-
-    Returns:
-        dict with status, metadata, and generated blog content
-    """
-
+def _build_messages(product_name: str, tone: str, word_count: int) -> list[dict]:
+    """Build the chat messages for a blog generation request."""
     prompt = f"""You are a professional SEO blog writer.
 
 Write a high-quality, engaging, and SEO-optimized blog article about the following product:
@@ -61,19 +45,40 @@ Conclusion:
 Call To Action:
 <Encourage reader action clearly>"""
 
+    return [
+        {"role": "system", "content": "You are a professional content strategist."},
+        {"role": "user", "content": prompt},
+    ]
+
+
+async def generate_blog(
+    product_name: str,
+    tone: str,
+    word_count: int,
+    model: str = DEFAULT_LLM_MODEL,
+) -> dict:
+    """
+    Generate an SEO-optimized blog article for a product using Groq API.
+
+    Args:
+        product_name: Name of the product to write about
+        tone:         Writing tone (e.g., Professional, Casual, Informative)
+        word_count:   Approximate word count
+        model:        LLM model identifier
+
+    Returns:
+        dict with status, metadata, and generated blog content
+    """
     logger.info("Generating blog for '%s' (tone=%s, ~%d words)", product_name, tone, word_count)
 
-    client = get_groq_client()
-    response = await asyncio.to_thread(
-        client.chat.completions.create,
-        model=model,
-        messages=[
-            {"role": "system", "content": "You are a professional content strategist."},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.7,
-        max_tokens=2000,
-    )
+    client = get_async_groq_client()
+    with span("groq.blog"):
+        response = await client.chat.completions.create(
+            model=model,
+            messages=_build_messages(product_name, tone, word_count),
+            temperature=0.7,
+            max_tokens=2000,
+        )
 
     generated_text = response.choices[0].message.content
     logger.info("Blog generated successfully for '%s'", product_name)
@@ -85,3 +90,36 @@ Call To Action:
         "word_count": word_count,
         "generated_blog": generated_text,
     }
+
+
+async def stream_blog(
+    product_name: str,
+    tone: str,
+    word_count: int,
+    model: str = DEFAULT_LLM_MODEL,
+) -> AsyncIterator[str]:
+    """
+    Stream an SEO-optimized blog article as Groq produces it.
+
+    Same prompt and parameters as `generate_blog`, but yields the text
+    deltas as they arrive instead of waiting for the full completion.
+    """
+    logger.info("Streaming blog for '%s' (tone=%s, ~%d words)", product_name, tone, word_count)
+
+    client = get_async_groq_client()
+    # Time to first byte from Groq, then the time spent relaying the stream
+    with span("groq.blog.connect"):
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=_build_messages(product_name, tone, word_count),
+            temperature=0.7,
+            max_tokens=2000,
+            stream=True,
+        )
+
+    with span("groq.blog.stream"):
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    logger.info("Blog streamed successfully for '%s'", product_name)
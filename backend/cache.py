@@ -0,0 +1,183 @@
+"""
+Prism AI — Caching Helpers
+
+A small in-process LRU cache with per-entry TTL, plus async cache backends
+so a cache can be shared across workers (Redis) when configured.
+
+Every named cache registers itself so hit/miss counters can be reported.
+"""
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from config import CACHE_REDIS_URL
+
+logger = logging.getLogger("prism.cache")
+
+_MISSING = object()
+
+
+# ─── In-Process LRU + TTL ────────────────────────────────────────────────────
+class TTLCache:
+    """Bounded LRU mapping whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Any, value: Any, ttl: float | None = None) -> None:
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Any, default: Any = None) -> Any:
+        entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def discard_where(self, predicate: Callable[[Any, Any], bool]) -> int:
+        """Drop every entry for which predicate(key, value) is true. Returns the count."""
+        doomed = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+        for key in doomed:
+            del self._data[key]
+        return len(doomed)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# ─── Async Backends ──────────────────────────────────────────────────────────
+class CacheBackend:
+    """Async cache interface for values that may be shared across workers."""
+
+    async def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Per-process backend built on TTLCache."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize, ttl)
+
+    async def get(self, key: str) -> Any:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: Any) -> None:
+        self._cache.set(key, value)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", **self._cache.stats()}
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Shared backend storing JSON values in Redis with an expiry.
+
+    Size is bounded by the server's maxmemory policy rather than here.
+    Redis errors are logged and treated as misses.
+    """
+
+    def __init__(self, url: str, namespace: str, ttl: float):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_REDIS_URL requires the redis package.") from e
+
+        self._client = redis.from_url(url)
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Any:
+        try:
+            raw = await self._client.get(f"prism:{self.namespace}:{key}")
+        except Exception as e:
+            logger.warning("Redis cache get failed: %s", e)
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Any) -> None:
+        try:
+            await self._client.set(f"prism:{self.namespace}:{key}", json.dumps(value), ex=int(self.ttl))
+        except Exception as e:
+            logger.warning("Redis cache set failed: %s", e)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# ─── Registry ────────────────────────────────────────────────────────────────
+_registry: dict[str, Any] = {}
+
+
+def register_cache(name: str, cache: Any) -> Any:
+    """Register any object with a `stats()` method for reporting."""
+    _registry[name] = cache
+    return cache
+
+
+def make_cache(name: str, maxsize: int, ttl: float) -> CacheBackend:
+    """Create a named async cache — Redis when CACHE_REDIS_URL is set, else in-process."""
+    if CACHE_REDIS_URL:
+        backend: CacheBackend = RedisCacheBackend(CACHE_REDIS_URL, name, ttl)
+    else:
+        backend = MemoryCacheBackend(maxsize, ttl)
+    return register_cache(name, backend)
+
+
+def cache_stats() -> dict[str, dict]:
+    """Hit/miss counters for every registered cache."""
+    return {name: cache.stats() for name, cache in _registry.items()}
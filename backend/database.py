@@ -1,107 +1,382 @@
+import asyncio
 import asyncpg
 import logging
-from config import DATABASE_URL
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from config import (
+    DATABASE_URL,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_ACQUIRE_TIMEOUT,
+    DB_COMMAND_TIMEOUT,
+    DB_CONNECT_TIMEOUT,
+    DB_RETRY_BACKOFF,
+    DB_STATEMENT_CACHE_SIZE,
+    USER_CACHE_SIZE,
+    USER_CACHE_TTL,
+    USAGE_SUMMARY_TTL,
+    USAGE_WRITE_BEHIND,
+    USAGE_BATCH_SIZE,
+    USAGE_FLUSH_INTERVAL,
+    USAGE_BUFFER_MAX,
+)
+from cache import TTLCache, register_cache
+from usage_writer import UsageLogWriter
+from migrate import migrate
+from tracing import span
 
 logger = logging.getLogger("prism.database")
 
 # Connection pool setup
 pool = None
+_pool_lock = asyncio.Lock()
+# When the last attempt to create the pool failed (monotonic seconds)
+_pool_failed_at: float | None = None
+
+# Short-lived cache of the user fields needed to authenticate a request.
+# Entries are dropped on admin updates; the TTL bounds staleness across workers.
+_auth_user_cache = register_cache("auth_user", TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL))
+
+# Per-user snapshot of today's usage, dropped whenever that user logs usage
+_usage_summary_cache = register_cache("usage_summary", TTLCache(USER_CACHE_SIZE, USAGE_SUMMARY_TTL))
+
+# Optional write-behind buffer for usage events (see usage_writer.py)
+usage_writer = (
+    UsageLogWriter(
+        lambda: acquire(),
+        batch_size=USAGE_BATCH_SIZE,
+        flush_interval=USAGE_FLUSH_INTERVAL,
+        max_buffer=USAGE_BUFFER_MAX,
+    )
+    if USAGE_WRITE_BEHIND
+    else None
+)
+
+# ─── Connection Pool ──────────────────────────────────────────────────────────
+class _PoolMetrics:
+    def __init__(self):
+        self.acquires = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float):
+        self.acquires += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+_pool_metrics = _PoolMetrics()
+
+def _in_backoff() -> bool:
+    return _pool_failed_at is not None and time.monotonic() - _pool_failed_at < DB_RETRY_BACKOFF
 
 async def get_pool():
-    global pool
-    if not pool:
-        if not DATABASE_URL:
-            logger.error("DATABASE_URL is not set!")
-            return None
-        try:
-            pool = await asyncpg.create_pool(DATABASE_URL)
-        except Exception as e:
-            logger.error(f"Failed to create database pool: {e}")
+    global pool, _pool_failed_at
+    if pool is None:
+        # A database that was just found unreachable is not retried by every
+        # request in turn; they fail fast until the backoff has passed
+        if _in_backoff():
             return None
+        # Concurrent first requests must not each create (and leak) a pool
+        async with _pool_lock:
+            if pool is None:
+                if _in_backoff():
+                    return None
+                if not DATABASE_URL:
+                    logger.error("DATABASE_URL is not set!")
+                    return None
+                try:
+                    pool = await asyncpg.create_pool(
+                        DATABASE_URL,
+                        min_size=DB_POOL_MIN_SIZE,
+                        max_size=DB_POOL_MAX_SIZE,
+                        timeout=DB_CONNECT_TIMEOUT,
+                        command_timeout=DB_COMMAND_TIMEOUT,
+                        # Each connection prepares a query on first use and
+                        # reuses it afterwards, across pool checkouts
+                        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+                    )
+                except Exception as e:
+                    _pool_failed_at = time.monotonic()
+                    logger.error(f"Failed to create database pool (retrying in {DB_RETRY_BACKOFF:g}s): {e}")
+                    return None
+                _pool_failed_at = None
     return pool
 
-async def init_db():
+@asynccontextmanager
+async def acquire():
+    """Check out a pool connection, recording how long the caller waited for it."""
     p = await get_pool()
-    async with p.acquire() as conn:
-        # Create users table
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY,
-                email TEXT UNIQUE NOT NULL,
-                name TEXT NOT NULL,
-                password_hash TEXT NOT NULL,
-                role TEXT DEFAULT 'user',
-                tier TEXT DEFAULT 'free',
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_login TIMESTAMP
-            )
-        ''')
-        
-        # Create usage_logs table
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS usage_logs (
-                id SERIAL PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                endpoint TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
+    if not p:
+        raise Exception("Database pool is unavailable.")
+    start = time.perf_counter()
+    try:
+        with span("db.acquire"):
+            conn = await p.acquire(timeout=DB_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        _pool_metrics.timeouts += 1
+        logger.error(f"Timed out after {DB_ACQUIRE_TIMEOUT}s waiting for a database connection")
+        raise
+    _pool_metrics.record_wait(time.perf_counter() - start)
+    try:
+        yield conn
+    finally:
+        await p.release(conn)
+
+def pool_stats() -> dict:
+    """Pool occupancy and connection wait times, for monitoring."""
+    m = _pool_metrics
+    stats = {
+        "initialized": pool is not None,
+        "acquires": m.acquires,
+        "timeouts": m.timeouts,
+        "avg_wait_ms": round(m.wait_total / m.acquires * 1000, 3) if m.acquires else 0.0,
+        "max_wait_ms": round(m.wait_max * 1000, 3),
+    }
+    if pool is not None:
+        size, idle = pool.get_size(), pool.get_idle_size()
+        stats.update(
+            size=size,
+            idle=idle,
+            in_use=size - idle,
+            min_size=pool.get_min_size(),
+            max_size=pool.get_max_size(),
+        )
+    return stats
+
+async def close_pool():
+    global pool
+    if pool is not None:
+        await pool.close()
+        pool = None
+
+# ─── Schema ───────────────────────────────────────────────────────────────────
+async def init_db():
+    """Bring the schema up to date (a single version check when already current)."""
+    async with acquire() as conn:
+        applied = await migrate(conn)
+    if applied:
+        logger.info(f"Applied {len(applied)} schema migration(s)")
 
 async def get_db():
-    p = await get_pool()
-    if not p:
-        raise Exception("Database connection pool is unavailable. Check DATABASE_URL and database status.")
-    async with p.acquire() as conn:
+    async with acquire() as conn:
         yield conn
 
-# Helper queries
+# ─── Helper Queries ───────────────────────────────────────────────────────────
 async def get_user_by_email(email: str):
-    p = await get_pool()
-    if not p:
-        raise Exception("Database pool is unavailable.")
-    async with p.acquire() as conn:
+    async with acquire() as conn:
         row = await conn.fetchrow("SELECT * FROM users WHERE email = $1", email)
         return dict(row) if row else None
 
 async def get_user_by_id(user_id: str):
-    p = await get_pool()
-    if not p:
-        raise Exception("Database pool is unavailable.")
-    async with p.acquire() as conn:
+    async with acquire() as conn:
         row = await conn.fetchrow("SELECT * FROM users WHERE id = $1", user_id)
         return dict(row) if row else None
 
+async def get_auth_user(user_id: str):
+    """Return the non-sensitive user fields used by the auth dependency, cached briefly."""
+    user = _auth_user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    async with acquire() as conn:
+        with span("db.user"):
+            row = await conn.fetchrow(
+                "SELECT id, email, name, role, tier, is_active, created_at FROM users WHERE id = $1",
+                user_id,
+            )
+    if not row:
+        return None
+    user = dict(row)
+    _auth_user_cache.set(user_id, user)
+    return user
+
+def invalidate_user(user_id: str):
+    """Drop a user from the auth cache after their tier, role or status changes."""
+    _auth_user_cache.pop(user_id)
+
 async def log_usage(user_id: str, endpoint: str):
-    p = await get_pool()
-    if not p:
+    _usage_summary_cache.pop(user_id)
+    if not await get_pool():
         logger.error("Database pool is unavailable. Cannot log usage.")
         return
-    async with p.acquire() as conn:
-        await conn.execute(
-            "INSERT INTO usage_logs (user_id, endpoint) VALUES ($1, $2)",
-            user_id, endpoint
-        )
+
+    if usage_writer is not None:
+        # Quotas are checked against usage_counters from every worker, so the
+        # counter is bumped now; only the log row and rollups are deferred
+        async with acquire() as conn:
+            with span("db.log_usage"):
+                await conn.execute('''
+                    INSERT INTO usage_counters (user_id, endpoint, day, count)
+                    VALUES ($1, $2, CURRENT_DATE, 1)
+                    ON CONFLICT (user_id, endpoint, day)
+                    DO UPDATE SET count = usage_counters.count + 1
+                ''', user_id, endpoint)
+        usage_writer.log(user_id, endpoint)
+        return
+
+    async with acquire() as conn:
+        with span("db.log_usage"):
+            # Log the event and bump its daily counter and platform rollups in
+            # one atomic statement
+            await conn.execute('''
+                WITH logged AS (
+                    INSERT INTO usage_logs (user_id, endpoint) VALUES ($1, $2)
+                    RETURNING created_at
+                ), counter AS (
+                    INSERT INTO usage_counters (user_id, endpoint, day, count)
+                    SELECT $1, $2, created_at::date, 1 FROM logged
+                    ON CONFLICT (user_id, endpoint, day)
+                    DO UPDATE SET count = usage_counters.count + 1
+                ), hourly AS (
+                    INSERT INTO usage_hourly (hour, endpoint, tier, count)
+                    SELECT date_trunc('hour', l.created_at), $2, u.tier, 1
+                    FROM logged l, users u
+                    WHERE u.id = $1
+                    ON CONFLICT (hour, endpoint, tier)
+                    DO UPDATE SET count = usage_hourly.count + 1
+                )
+                INSERT INTO usage_totals (endpoint, count)
+                SELECT $2, 1 FROM logged
+                ON CONFLICT (endpoint)
+                DO UPDATE SET count = usage_totals.count + 1
+            ''', user_id, endpoint)
 
 async def get_today_usage(user_id: str, endpoint: str) -> int:
-    p = await get_pool()
-    if not p:
+    if not await get_pool():
         logger.error("Database pool is unavailable. Defaulting to 0 usage.")
         return 0
-    async with p.acquire() as conn:
-        count = await conn.fetchval('''
-            SELECT COUNT(*) 
-            FROM usage_logs 
-            WHERE user_id = $1 
-              AND endpoint = $2 
-              AND created_at::date = CURRENT_DATE
-        ''', user_id, endpoint)
-        return count if count else 0
+    async with acquire() as conn:
+        with span("db.usage_count"):
+            count = await conn.fetchval('''
+                SELECT count
+                FROM usage_counters
+                WHERE user_id = $1
+                  AND endpoint = $2
+                  AND day = CURRENT_DATE
+            ''', user_id, endpoint)
+    return count or 0
+
+async def get_usage_summary(user_id: str) -> dict[str, int]:
+    """
+    Return today's usage for every endpoint as {endpoint: count} in one query.
+
+    Served from a short-lived snapshot that log_usage invalidates, so repeated
+    profile polls don't touch the database.
+    """
+    summary = _usage_summary_cache.get(user_id)
+    if summary is None:
+        if not await get_pool():
+            logger.error("Database pool is unavailable. Defaulting to 0 usage.")
+            return {}
+        async with acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT endpoint, count
+                FROM usage_counters
+                WHERE user_id = $1
+                  AND day = CURRENT_DATE
+            ''', user_id)
+        summary = {row["endpoint"]: row["count"] for row in rows}
+        _usage_summary_cache.set(user_id, summary)
+    return summary
+
+async def consume_refresh_token(jti: str, expires_at: datetime) -> bool:
+    """
+    Mark a refresh token as used. Returns False if it was already used.
+
+    A few expired entries are purged on each call, so the table only holds
+    tokens that could still be replayed.
+    """
+    async with acquire() as conn:
+        consumed = await conn.fetchval('''
+            WITH purged AS (
+                DELETE FROM revoked_tokens
+                WHERE jti IN (
+                    SELECT jti FROM revoked_tokens
+                    WHERE expires_at < $3
+                    LIMIT 10
+                )
+            )
+            INSERT INTO revoked_tokens (jti, expires_at) VALUES ($1, $2)
+            ON CONFLICT (jti) DO NOTHING
+            RETURNING jti
+        ''', uuid.UUID(jti), expires_at, datetime.utcnow())
+    return consumed is not None
 
 async def get_user_count() -> int:
-    p = await get_pool()
-    if not p:
-        raise Exception("Database pool is unavailable.")
-    async with p.acquire() as conn:
+    async with acquire() as conn:
         return await conn.fetchval("SELECT COUNT(*) FROM users")
+
+async def get_platform_stats() -> dict:
+    """User count and all-time generation totals per endpoint, in one query."""
+    async with acquire() as conn:
+        row = await conn.fetchrow('''
+            SELECT
+                (SELECT COUNT(*) FROM users) AS total_users,
+                COALESCE(SUM(count) FILTER (WHERE endpoint = 'generate-blog'), 0)::BIGINT AS total_blogs,
+                COALESCE(SUM(count) FILTER (WHERE endpoint = 'generate-video-script'), 0)::BIGINT AS total_videos,
+                COALESCE(SUM(count) FILTER (WHERE endpoint = 'generate-image'), 0)::BIGINT AS total_images
+            FROM usage_totals
+        ''')
+        return dict(row)
+
+async def get_usage_timeseries(bucket: str, days: int) -> list[dict]:
+    """
+    Generation counts per `bucket` ("hour" or "day"), endpoint and tier over
+    the last `days` days, served from the hourly rollup.
+    """
+    async with acquire() as conn:
+        rows = await conn.fetch('''
+            SELECT date_trunc($1, hour) AS bucket, endpoint, tier, SUM(count)::BIGINT AS count
+            FROM usage_hourly
+            WHERE hour >= date_trunc($1, LOCALTIMESTAMP - make_interval(days => $2))
+            GROUP BY 1, 2, 3
+            ORDER BY 1, 2, 3
+        ''', bucket, days)
+        return [dict(row) for row in rows]
+
+async def list_users_page(
+    limit: int,
+    after: tuple | None = None,
+    tier: str | None = None,
+    role: str | None = None,
+    is_active: bool | None = None,
+    email_prefix: str | None = None,
+) -> list[dict]:
+    """
+    One page of users, newest first, keyset-paginated on (created_at, id).
+
+    `after` is the (created_at, id) of the last row of the previous page.
+    Only the columns shown in the admin table are selected.
+    """
+    conditions, args = [], []
+
+    def param(value) -> str:
+        args.append(value)
+        return f"${len(args)}"
+
+    if after is not None:
+        conditions.append(f"(created_at, id) < ({param(after[0])}, {param(after[1])})")
+    if tier is not None:
+        conditions.append(f"tier = {param(tier)}")
+    if role is not None:
+        conditions.append(f"role = {param(role)}")
+    if is_active is not None:
+        conditions.append(f"is_active = {param(is_active)}")
+    if email_prefix:
+        # Escape LIKE wildcards so the prefix is matched literally
+        escaped = email_prefix.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conditions.append(f"lower(email) LIKE {param(escaped + '%')}")
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    async with acquire() as conn:
+        rows = await conn.fetch(f'''
+            SELECT id, email, name, role, tier, is_active, created_at, last_login
+            FROM users
+            {where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT {param(limit)}
+        ''', *args)
+        return [dict(row) for row in rows]
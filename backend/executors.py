@@ -0,0 +1,185 @@
+"""
+Prism AI — Bounded Executors
+
+Runs CPU-bound work (password hashing, image post-processing) off the event
+loop in a size-limited worker pool. Each executor also caps how many jobs
+may be queued or running at once; past that, `run()` fails fast with
+ExecutorBusy so handlers can shed load instead of stalling behind an
+ever-growing backlog.
+
+Process pools give true parallelism for pure-Python work. Where they can't
+be created (e.g. no multiprocessing support on serverless hosts), a thread
+pool is used instead. An `initializer` runs once in every worker as it
+starts, which is where per-process caches should be warmed.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from tracing import Counter, Gauge
+
+logger = logging.getLogger("prism.executors")
+
+
+class ExecutorBusy(Exception):
+    """Raised when an executor's queue is full."""
+
+
+class BoundedExecutor:
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        max_pending: int,
+        use_processes: bool = True,
+        initializer: Callable[[], None] | None = None,
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.use_processes = use_processes
+        self.initializer = initializer
+
+        self._executor: Executor | None = None
+        self._inflight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+        # CPU seconds reported by jobs, per stage (see add_cpu_time)
+        self.cpu_seconds: dict[str, float] = {}
+        _registry[name] = self
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                try:
+                    # spawn, not fork: forking a process with running threads is unsafe
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=self.initializer,
+                    )
+                except (OSError, NotImplementedError, ImportError) as e:
+                    logger.warning(f"Process pool unavailable for '{self.name}', using threads: {e}")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=f"prism-{self.name}",
+                    initializer=self.initializer,
+                )
+        return self._executor
+
+    @property
+    def kind(self) -> str:
+        if self._executor is None:
+            return "idle"
+        return "process" if isinstance(self._executor, ProcessPoolExecutor) else "thread"
+
+    async def start(self) -> None:
+        """
+        Create the pool and start every worker now instead of on first use,
+        so each runs `initializer` before any request is waiting on it.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        # Pools add a worker per submission while none is idle, so one
+        # no-op job per worker brings all of them up
+        await asyncio.gather(*(loop.run_in_executor(executor, _noop) for _ in range(self.max_workers)))
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run fn(*args) in the pool and return its result.
+
+        `fn` and its arguments must be picklable when a process pool is used.
+        Raises ExecutorBusy without queueing when `max_pending` jobs are
+        already waiting or running.
+        """
+        if self._inflight >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorBusy(f"{self.name} executor is at capacity")
+
+        self._inflight += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool for the next job
+            logger.error(f"'{self.name}' process pool broke, restarting it")
+            self.shutdown()
+            raise
+        finally:
+            self._inflight -= 1
+            self.completed += 1
+            self.busy_seconds += time.perf_counter() - start
+
+    @property
+    def queued(self) -> int:
+        """Jobs accepted but still waiting for a free worker."""
+        return max(0, self._inflight - self.max_workers)
+
+    def add_cpu_time(self, stages: dict[str, float]) -> None:
+        """Record CPU seconds a job spent in each of its stages."""
+        for stage, seconds in stages.items():
+            self.cpu_seconds[stage] = self.cpu_seconds.get(stage, 0.0) + seconds
+            _EXECUTOR_CPU.inc(self.name, stage, amount=seconds)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self._inflight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_latency_ms": round(self.busy_seconds / self.completed * 1000, 3) if self.completed else 0.0,
+            "cpu_ms": {stage: round(seconds * 1000, 3) for stage, seconds in self.cpu_seconds.items()},
+        }
+
+
+def _noop() -> None:
+    pass
+
+
+# ─── Registry ────────────────────────────────────────────────────────────────
+_registry: dict[str, BoundedExecutor] = {}
+
+
+def executor_stats() -> dict[str, dict]:
+    """Queue depth and throughput for every executor."""
+    return {name: executor.stats() for name, executor in _registry.items()}
+
+
+_EXECUTOR_CPU = Counter(
+    "prism_executor_cpu_seconds_total",
+    "CPU time spent by executor jobs, per stage.",
+    ("executor", "stage"),
+)
+Gauge(
+    "prism_executor_pending",
+    "Jobs queued or running in each executor.",
+    ("executor",),
+    lambda: {(name,): executor._inflight for name, executor in _registry.items()},
+)
+Gauge(
+    "prism_executor_queued",
+    "Jobs waiting for a free worker in each executor.",
+    ("executor",),
+    lambda: {(name,): executor.queued for name, executor in _registry.items()},
+)
+
+
+def shutdown_executors() -> None:
+    for executor in _registry.values():
+        executor.shutdown()
@@ -6,42 +6,136 @@ Uses a two-step pipeline:
   2. Hugging Face Inference API (FLUX.1-schnell) generates the image
 
 Supports configurable model, seed, per-platform dimensions, and watermarking.
+One generation can be fitted to several platforms' exact sizes.
 """
 
+from __future__ import annotations
+
 import asyncio
+import base64
 import logging
+import math
+import time
 import uuid
+from array import array
+from functools import lru_cache
+from io import BytesIO
 from pathlib import Path
-
-from PIL import Image, ImageEnhance
+from typing import TYPE_CHECKING, AsyncIterator
 
 from config import (
     DEFAULT_IMAGE_MODEL,
     DEFAULT_LLM_MODEL,
+    IMAGE_BATCH_CONCURRENCY,
+    IMAGE_DIR,
+    IMAGE_EXECUTOR_MAX_PENDING,
+    IMAGE_EXECUTOR_PROCESSES,
+    IMAGE_EXECUTOR_WORKERS,
+    IMAGE_NATIVE_MAX_PIXELS,
+    IMAGE_THUMBNAIL_WIDTHS,
     PLATFORM_SIZES,
-    get_groq_client,
-    get_hf_client,
+    PROMPT_CACHE_ENABLED,
+    PROMPT_CACHE_SIZE,
+    PROMPT_CACHE_TTL,
+    SEED_CACHE_ENABLED,
+    SEED_CACHE_MAX_BYTES,
+    WARM_CACHES_ON_STARTUP,
+    get_async_groq_client,
+    get_async_hf_client,
+    hf_semaphore,
 )
+from cache import make_cache, register_cache
+from executors import BoundedExecutor
+from image_store import EXTENSIONS, SeedResultCache, get_image_store, publish_image
+from tracing import record_span, span
+
+# Pillow is imported inside the functions that use it, keeping it off the
+# cold-start path of requests that never touch images
+if TYPE_CHECKING:
+    from PIL import Image
 
 logger = logging.getLogger("prism.image")
 
-import os
-# Directory to save generated images (use /tmp on Vercel)
-if os.getenv("VERCEL"):
-    IMAGE_DIR = Path("/tmp/generated_images")
-else:
-    IMAGE_DIR = Path(__file__).parent / "generated_images"
-IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+# LLM-crafted prompts keyed by (product_name, style, platform)
+_prompt_cache = (
+    make_cache("image_prompt", PROMPT_CACHE_SIZE, PROMPT_CACHE_TTL)
+    if PROMPT_CACHE_ENABLED
+    else None
+)
+
+# Raw FLUX output for seeded calls, keyed by everything that determines it
+_seed_cache = (
+    register_cache("seed_image", SeedResultCache(IMAGE_DIR / "seed_cache", SEED_CACHE_MAX_BYTES))
+    if SEED_CACHE_ENABLED
+    else None
+)
+
+# Raw pixels passed to and between executor jobs: (mode, size, bytes)
+PixelBuffer = tuple[str, tuple[int, int], bytes]
+# An inference result as sent to the image executor: the encoded bytes the
+# API returned, or a raw pixel buffer
+ImageSource = bytes | PixelBuffer
 
 # Watermark logo path
 WATERMARK_PATH = Path(__file__).parent.parent / "frontend" / "watermark.png"
 
 
 # ─── Watermark Helper ────────────────────────────────────────────────────────
+WATERMARK_OPACITY = 0.4
+WATERMARK_SCALE = 0.08
+
+
+@lru_cache(maxsize=32)
+def _build_watermark_layer(
+    width: int,
+    opacity: float,
+    scale: float,
+    mtime_ns: int,
+) -> Image.Image:
+    """
+    Load, resize and fade the watermark for a given output width.
+
+    `mtime_ns` is part of the cache key so that replacing the watermark file
+    invalidates every layer built from the previous version.
+    """
+    from PIL import Image, ImageEnhance
+
+    with Image.open(WATERMARK_PATH) as source:
+        watermark = source.convert("RGBA")
+    wm_width = int(width * scale)
+    wm_ratio = wm_width / watermark.width
+    wm_height = int(watermark.height * wm_ratio)
+    watermark = watermark.resize((wm_width, wm_height), Image.LANCZOS)
+
+    # Adjust opacity
+    alpha = watermark.split()[3]  # extract alpha channel
+    alpha = ImageEnhance.Brightness(alpha).enhance(opacity)
+    watermark.putalpha(alpha)
+    return watermark
+
+
+def _get_watermark_layer(width: int, opacity: float, scale: float) -> Image.Image | None:
+    """Return the cached watermark layer for `width`, or None if the logo is missing."""
+    try:
+        mtime_ns = WATERMARK_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _build_watermark_layer(width, opacity, scale, mtime_ns)
+
+
+def warm_watermark_cache(
+    opacity: float = WATERMARK_OPACITY,
+    scale: float = WATERMARK_SCALE,
+) -> None:
+    """Pre-build watermark layers for every platform width."""
+    for size in PLATFORM_SIZES.values():
+        _get_watermark_layer(size["width"], opacity, scale)
+
+
 def _apply_watermark(
     image: Image.Image,
-    opacity: float = 0.4,
-    scale: float = 0.08,
+    opacity: float = WATERMARK_OPACITY,
+    scale: float = WATERMARK_SCALE,
     padding: int = 12,
 ) -> Image.Image:
     """
@@ -56,32 +150,229 @@ def _apply_watermark(
     Returns:
         A new PIL Image with the watermark composited.
     """
-    if not WATERMARK_PATH.exists():
+    watermark = _get_watermark_layer(image.width, opacity, scale)
+    if watermark is None:
         logger.warning("Watermark logo not found at %s — skipping.", WATERMARK_PATH)
         return image
 
-    # Load and resize watermark
-    watermark = Image.open(WATERMARK_PATH).convert("RGBA")
-    wm_width = int(image.width * scale)
-    wm_ratio = wm_width / watermark.width
-    wm_height = int(watermark.height * wm_ratio)
-    watermark = watermark.resize((wm_width, wm_height), Image.LANCZOS)
-
-    # Adjust opacity
-    alpha = watermark.split()[3]  # extract alpha channel
-    alpha = ImageEnhance.Brightness(alpha).enhance(opacity)
-    watermark.putalpha(alpha)
-
     # Position: bottom-right with padding
     base = image.convert("RGBA")
-    x = base.width - wm_width - padding
-    y = base.height - wm_height - padding
+    x = base.width - watermark.width - padding
+    y = base.height - watermark.height - padding
 
     # Composite and convert back to RGB for PNG saving
     base.paste(watermark, (x, y), watermark)
     return base.convert("RGB")
 
 
+# ─── Post-processing (runs in image_executor) ────────────────────────────────
+def _init_image_worker() -> None:
+    """Build the watermark layers in each worker, whose caches are per process."""
+    try:
+        warm_watermark_cache()
+    except Exception as e:
+        # An initializer that raises would break the whole pool
+        logger.warning(f"Could not pre-build watermark layers: {e}")
+
+
+# Decoding, watermarking and encoding are CPU-bound and would stall every
+# other request on the event loop, so they run in this pool
+image_executor = BoundedExecutor(
+    "image",
+    max_workers=IMAGE_EXECUTOR_WORKERS,
+    max_pending=IMAGE_EXECUTOR_MAX_PENDING,
+    use_processes=IMAGE_EXECUTOR_PROCESSES,
+    initializer=_init_image_worker if WARM_CACHES_ON_STARTUP else None,
+)
+
+
+class _StageClock:
+    """Accumulates the CPU time of the current thread per named stage."""
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        self._mark = time.thread_time()
+
+    def lap(self, stage: str) -> None:
+        now = time.thread_time()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._mark
+        self._mark = now
+
+
+def _decode_image(source: ImageSource) -> tuple[PixelBuffer, dict[str, float]]:
+    """Decode an inference result. Returns (pixels, cpu_seconds_by_stage)."""
+    from PIL import Image
+
+    clock = _StageClock()
+    if isinstance(source, bytes):
+        image = Image.open(BytesIO(source))
+        image.load()
+    else:
+        image = Image.frombytes(*source)
+    clock.lap("decode")
+    return (image.mode, image.size, image.tobytes()), clock.stages
+
+
+# Share of a crop's score lost at the far edge of its range, so images
+# without a clear subject are cropped from the centre
+CROP_CENTER_BIAS = 0.1
+
+
+def _smart_crop_box(image: Image.Image, aspect: float) -> tuple[int, int, int, int]:
+    """
+    Largest box with the given aspect ratio, positioned along the axis that
+    has to be cropped where the image has the most edge energy (detail).
+    """
+    from PIL import Image, ImageFilter
+
+    width, height = image.size
+    horizontal = width / height > aspect
+    if horizontal:
+        crop = min(width, round(height * aspect))
+        slack = width - crop
+    else:
+        crop = min(height, round(width / aspect))
+        slack = height - crop
+    if slack <= 0:
+        return (0, 0, width, height)
+
+    # Edge energy per column (or row) of a small grayscale copy
+    small = image.convert("L")
+    small.thumbnail((256, 256))
+    edges = small.filter(ImageFilter.FIND_EDGES).convert("F")
+    # The filter copies the 1px border through unchanged; it is not detail
+    edges = edges.crop((1, 1, edges.width - 1, edges.height - 1))
+    profile_size = (edges.width, 1) if horizontal else (1, edges.height)
+    profile = array("f", edges.resize(profile_size, Image.BOX).tobytes())
+
+    scale = len(profile) / (width if horizontal else height)
+    window = max(1, min(len(profile), round(crop * scale)))
+    positions = len(profile) - window
+    prefix = [0.0]
+    for value in profile:
+        prefix.append(prefix[-1] + value)
+
+    def score(start: int) -> float:
+        distance = abs(start - positions / 2) / (positions / 2) if positions else 0.0
+        return (prefix[start + window] - prefix[start]) * (1 - CROP_CENTER_BIAS * distance)
+
+    # Ties (e.g. a flat image with no edges at all) go to the most central position
+    best = max(range(positions + 1), key=lambda start: (score(start), -abs(start - positions / 2)))
+    offset = min(slack, round(best / scale))
+    if horizontal:
+        return (offset, 0, offset + crop, height)
+    return (0, offset, width, offset + crop)
+
+
+def _fit_image(
+    pixels: PixelBuffer,
+    size: tuple[int, int],
+    watermark: bool,
+) -> tuple[PixelBuffer, dict[str, float]]:
+    """
+    Crop and resize an image to exactly `size`, then optionally watermark it.
+    Returns (pixels, cpu_seconds_by_stage).
+    """
+    from PIL import Image
+
+    clock = _StageClock()
+    image = Image.frombytes(*pixels)
+    if image.size != size:
+        box = _smart_crop_box(image, size[0] / size[1])
+        image = image.resize(size, Image.LANCZOS, box=box, reducing_gap=3.0)
+        clock.lap("fit")
+
+    if watermark:
+        image = _apply_watermark(image)
+        clock.lap("watermark")
+    return (image.mode, image.size, image.tobytes()), clock.stages
+
+
+def _save_options(image_format: str, quality: int) -> dict:
+    """Pillow `save()` arguments for an output format."""
+    if image_format == "jpeg":
+        return {"format": "JPEG", "quality": quality, "optimize": True, "progressive": True}
+    if image_format == "webp":
+        return {"format": "WEBP", "quality": quality, "method": 4}
+    if image_format == "avif":
+        return {"format": "AVIF", "quality": quality}
+    return {"format": "PNG"}
+
+
+def _encode_variant(
+    pixels: PixelBuffer,
+    image_format: str,
+    quality: int,
+    width: int | None,
+    inline: bool,
+) -> tuple[bytes, str | None, tuple[int, int], dict[str, float]]:
+    """
+    Encode one output variant, downscaled to `width` when given.
+
+    Returns (data, base64_or_None, (width, height), cpu_seconds_by_stage);
+    the base64 form is only produced when `inline` is set, i.e. for data URIs.
+    """
+    from PIL import Image
+
+    clock = _StageClock()
+    image = Image.frombytes(*pixels)
+    if width is not None and width < image.width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        clock.lap("resize")
+    if image_format == "jpeg" and image.mode != "RGB":
+        image = image.convert("RGB")
+
+    buffered = BytesIO()
+    image.save(buffered, **_save_options(image_format, quality))
+    data = buffered.getvalue()
+    clock.lap(f"encode_{image_format}")
+
+    encoded = None
+    if inline:
+        encoded = base64.b64encode(data).decode()
+        clock.lap("base64")
+    return data, encoded, image.size, clock.stages
+
+
+async def _run_postprocess(fn, *args) -> tuple:
+    """
+    Run a post-processing job in image_executor and record the per-stage CPU
+    time it reports (the last item of its result). Returns the other items.
+    """
+    *result, cpu = await image_executor.run(fn, *args)
+    image_executor.add_cpu_time(cpu)
+    for stage, seconds in cpu.items():
+        record_span(f"image.cpu.{stage}", seconds)
+    return tuple(result)
+
+
+async def _gather_or_cancel(*aws) -> list:
+    """
+    Like asyncio.gather, but when one awaitable fails the others are
+    cancelled and waited for before the error is raised, so a failed image
+    gives its executor slots back straight away.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+@lru_cache(maxsize=1)
+def supported_formats() -> frozenset[str]:
+    """Output formats this Pillow build can encode."""
+    from PIL import features
+
+    formats = {"png", "jpeg"}
+    formats.update(f for f in ("webp", "avif") if features.check(f))
+    return frozenset(formats)
+
+
 # ─── Prompt Engineering ──────────────────────────────────────────────────────
 async def _generate_image_prompt(
     product_name: str,
@@ -110,39 +401,173 @@ Requirements:
 
 Output the image prompt directly, nothing else."""
 
-    client = get_groq_client()
-
-    # Groq SDK is synchronous — run in a thread to avoid blocking the event loop
-    response = await asyncio.to_thread(
-        client.chat.completions.create,
-        model=DEFAULT_LLM_MODEL,
-        messages=[
-            {"role": "system", "content": "You are a visual design prompt engineer."},
-            {"role": "user", "content": meta_prompt},
-        ],
-        temperature=0.8,
-        max_tokens=300,
-    )
+    client = get_async_groq_client()
+    with span("groq.image_prompt"):
+        response = await client.chat.completions.create(
+            model=DEFAULT_LLM_MODEL,
+            messages=[
+                {"role": "system", "content": "You are a visual design prompt engineer."},
+                {"role": "user", "content": meta_prompt},
+            ],
+            temperature=0.8,
+            max_tokens=300,
+        )
 
     return response.choices[0].message.content.strip()
 
 
+async def _get_image_prompt(
+    product_name: str,
+    style: str,
+    platform: str,
+    use_cache: bool = True,
+) -> str:
+    """
+    Return the image prompt for (product_name, style, platform), reusing a
+    cached one when available. With `use_cache=False` a fresh prompt is
+    generated and replaces the cached entry.
+    """
+    if _prompt_cache is None:
+        return await _generate_image_prompt(product_name, style, platform)
+
+    key = "|".join((product_name.strip(), style, platform.lower()))
+    if use_cache:
+        cached = await _prompt_cache.get(key)
+        if cached is not None:
+            logger.info("Using cached image prompt for '%s' (%s / %s)", product_name, style, platform)
+            return cached
+
+    image_prompt = await _generate_image_prompt(product_name, style, platform)
+    await _prompt_cache.set(key, image_prompt)
+    return image_prompt
+
+
+# ─── Inference ───────────────────────────────────────────────────────────────
+async def _generate_single_image(
+    client,
+    image_prompt: str,
+    dimensions: dict[str, int],
+    seed: int | None,
+) -> ImageSource:
+    """
+    Run one FLUX inference call and return the result for post-processing.
+
+    Seeded calls are served from the seed cache when the same prompt, size
+    and seed were generated before.
+    """
+    generate_kwargs: dict = {
+        "width": dimensions["width"],
+        "height": dimensions["height"],
+    }
+    cache_key = None
+    if seed is not None:
+        generate_kwargs["seed"] = seed
+        if _seed_cache is not None:
+            cache_key = SeedResultCache.result_key(
+                image_prompt, DEFAULT_IMAGE_MODEL, dimensions["width"], dimensions["height"], seed
+            )
+            with span("hf.seed_cache"):
+                cached = await _seed_cache.lookup(cache_key)
+            if cached is not None:
+                return cached
+
+    try:
+        with span("hf.queue"):
+            await hf_semaphore.acquire()
+        try:
+            with span("hf.text_to_image"):
+                image_result = await client.text_to_image(
+                    prompt=image_prompt,
+                    model=DEFAULT_IMAGE_MODEL,
+                    **generate_kwargs,
+                )
+        finally:
+            hf_semaphore.release()
+    except Exception:
+        logger.exception("Hugging Face API inference failed! This is often due to missing HF_API_KEY or model timeouts.")
+        raise
+
+    # HF returns raw bytes, or a PIL Image when Pillow is installed. That image
+    # is opened lazily over the response body, so forward the still-encoded
+    # bytes instead of decoding them here on the event loop.
+    if isinstance(image_result, (bytes, bytearray)):
+        data = bytes(image_result)
+    elif isinstance(getattr(image_result, "fp", None), BytesIO):
+        data = image_result.fp.getvalue()
+    else:
+        return (image_result.mode, image_result.size, image_result.tobytes())
+
+    if cache_key is not None:
+        try:
+            await _seed_cache.store(cache_key, data)
+        except OSError as e:
+            logger.warning("Could not write seed cache entry: %s", e)
+    return data
+
+
+# ─── Platform Sizing ─────────────────────────────────────────────────────────
+# Diffusion models work in latent blocks; sizes off this grid get snapped
+IMAGE_SIZE_MULTIPLE = 64
+
+
+def platform_size(platform: str) -> tuple[int, int]:
+    size = PLATFORM_SIZES.get(platform.lower(), {"width": 1024, "height": 1024})
+    return size["width"], size["height"]
+
+
+def native_size(targets: list[tuple[int, int]]) -> tuple[int, int]:
+    """
+    Size to generate at so that every target can be cropped from one image:
+    the bounding box of the targets, scaled down to IMAGE_NATIVE_MAX_PIXELS
+    if needed, in multiples of IMAGE_SIZE_MULTIPLE.
+    """
+    width = max(w for w, _ in targets)
+    height = max(h for _, h in targets)
+    scale = min(1.0, math.sqrt(IMAGE_NATIVE_MAX_PIXELS / (width * height)))
+
+    def snap(value: float) -> int:
+        return max(IMAGE_SIZE_MULTIPLE, math.ceil(value / IMAGE_SIZE_MULTIPLE) * IMAGE_SIZE_MULTIPLE)
+
+    width, height = snap(width * scale), snap(height * scale)
+    # Rounding up may overshoot the pixel cap; trim the longer side back
+    while width * height > IMAGE_NATIVE_MAX_PIXELS and max(width, height) > IMAGE_SIZE_MULTIPLE:
+        if width >= height:
+            width -= IMAGE_SIZE_MULTIPLE
+        else:
+            height -= IMAGE_SIZE_MULTIPLE
+    return width, height
+
+
 # ─── Image Generation ────────────────────────────────────────────────────────
-async def generate_image(
+async def stream_image(
     product_name: str,
     style: str,
     platform: str,
     seed: int | None = None,
     n: int = 1,
     watermark: bool = True,
-) -> dict:
+    use_prompt_cache: bool = True,
+    image_format: str = "png",
+    quality: int = 90,
+    thumbnail_widths: tuple[int, ...] = IMAGE_THUMBNAIL_WIDTHS,
+    platforms: list[str] | None = None,
+) -> AsyncIterator[tuple[str, dict]]:
     """
-    Generate social media image(s) for a product using Hugging Face Inference API.
+    Generate social media image(s) for a product using Hugging Face Inference
+    API, yielding (event, data) pairs as the work progresses.
 
     Workflow:
       1. Groq LLM crafts an optimized image prompt
-      2. Hugging Face FLUX model generates the image(s)
-      3. Images are saved locally
+      2. A native size is chosen that covers `platform` and any extra
+         `platforms`
+      3. All `n` images go through the remaining steps concurrently:
+         a. Hugging Face FLUX generates the image once, at the native size
+         b. image_executor decodes it, then, per platform, smart-crops and
+            resizes it to the exact dimensions, watermarks it, and encodes a
+            full-size variant in `image_format` plus one thumbnail per width
+            in `thumbnail_widths`
+         c. The variants are published and the image is yielded as soon as
+            it is ready, so images arrive in completion order
 
     Args:
         product_name: Name of the product
@@ -151,9 +576,23 @@ async def generate_image(
         seed:         Optional seed for reproducible generation
         n:            Number of images to generate (1-4)
         watermark:    Whether to apply a watermark to the image
-
-    Returns:
-        dict with status, metadata, image URLs, and the generated prompt
+        use_prompt_cache: Reuse a cached LLM prompt for the same product/style/platform
+        image_format: Output encoding: png, webp, jpeg or avif (see supported_formats)
+        quality:      Encoder quality for the lossy formats (1-100)
+        thumbnail_widths: Widths of the thumbnail variants; ones not smaller than the image are skipped
+        platforms:    Extra platforms to fit the same generations to
+
+    Yields:
+        ("prompt", ...)       once, with the image prompt and output sizes
+        ("image", ...)        per image as soon as it is ready, in completion
+                              order; "index" gives its place in the batch
+        ("image_failed", ...) per image that could not be generated
+        ("done", ...)         last, with the batch summary and failed indices
+
+        Each image lists its "variants" (full size first) with their byte sizes,
+        and has one entry per platform under "platforms"; its top-level
+        fields describe the output for `platform`. Raises only if every image
+        in the batch fails.
     """
     
     # First, verify that HF API KEY exists
@@ -162,91 +601,187 @@ async def generate_image(
         logger.error("HF_API_KEY environment variable is not set. Hugging Face Inference will fail.")
         # Raise explicitly so the user can see in Vercel logs why it fails
         raise ValueError("HF_API_KEY is missing from environment variables.")
+    if image_format not in supported_formats():
+        raise ValueError(f"Unsupported image format: {image_format}")
     platform_lower = platform.lower()
-    dimensions = PLATFORM_SIZES.get(platform_lower, {"width": 1024, "height": 1024})
+    targets = list(dict.fromkeys([platform_lower, *(p.lower() for p in platforms or ())]))
+    sizes = {target: platform_size(target) for target in targets}
+    dimensions = dict(zip(("width", "height"), sizes[platform_lower]))
+    native = dict(zip(("width", "height"), native_size(list(sizes.values()))))
 
     # Step 1 — Generate an optimized image prompt via Groq
     logger.info("Generating image prompt for '%s' (%s / %s)", product_name, style, platform)
-    image_prompt = await _generate_image_prompt(product_name, style, platform)
+    image_prompt = await _get_image_prompt(product_name, style, platform, use_prompt_cache)
     logger.info("Prompt generated (%d chars)", len(image_prompt))
+    count = min(n, 4)
+    summary = {
+        "status": "success",
+        "product_name": product_name,
+        "style": style,
+        "platform": platform,
+        "dimensions": dimensions,
+        "native_size": native,
+        "platforms": targets,
+        "image_format": image_format,
+        "image_prompt": image_prompt,
+    }
+    yield "prompt", {**summary, "count": count}
 
     # Step 2 — Generate image(s) via Hugging Face Inference API
     try:
-        client = get_hf_client()
+        client = get_async_hf_client()
     except Exception as e:
         logger.exception("Failed to initialize Hugging Face client")
         raise e
-    count = min(n, 4)
 
     logger.info(
-        "Calling Hugging Face (%s, %dx%d, n=%d)",
+        "Calling Hugging Face (%s, %dx%d, n=%d) for %s",
         DEFAULT_IMAGE_MODEL,
-        dimensions["width"],
-        dimensions["height"],
+        native["width"],
+        native["height"],
         count,
+        ", ".join(targets),
     )
 
-    # HF text_to_image returns a PIL Image — generate `n` images sequentially
-    saved_images: list[dict] = []
-    for idx in range(count):
-        # Build kwargs for text_to_image
-        generate_kwargs: dict = {
-            "width": dimensions["width"],
-            "height": dimensions["height"],
+    # Per-request cap on parallel FLUX calls; hf_semaphore caps the worker overall
+    batch_slots = asyncio.Semaphore(IMAGE_BATCH_CONCURRENCY)
+    # A batch fans out to images x platforms post-processing jobs. Jobs past
+    # the pool's worker count would only queue, so keep at most that many
+    # submitted per request rather than filling max_pending and having the
+    # request's own jobs rejected with ExecutorBusy.
+    executor_slots = asyncio.Semaphore(min(image_executor.max_workers, image_executor.max_pending))
+
+    async def postprocess(fn, *args) -> tuple:
+        async with executor_slots:
+            return await _run_postprocess(fn, *args)
+
+    inline = get_image_store() is None
+    # Lossless thumbnails would defeat their purpose, so PNG output gets WebP thumbnails
+    thumbnail_format = "webp" if image_format == "png" and "webp" in supported_formats() else image_format
+    slug = product_name.replace(" ", "_").lower()
+
+    async def render_output(pixels: PixelBuffer, target: str) -> dict:
+        jobs = [("full", image_format, None)] + [
+            ("thumbnail", thumbnail_format, width)
+            for width in sorted(set(thumbnail_widths))
+            if width < sizes[target][0]
+        ]
+        # Wall times here include any wait for a free worker; the per-stage
+        # CPU time measured in the worker is recorded separately
+        with span("image.fit"):
+            (fitted,) = await postprocess(_fit_image, pixels, sizes[target], watermark)
+
+        with span("image.encode"):
+            encoded = await _gather_or_cancel(*(
+                postprocess(_encode_variant, fitted, fmt, quality, width, inline)
+                for _, fmt, width in jobs
+            ))
+
+        # Content-addressed /images URLs, or inline data URIs (serverless-friendly default)
+        with span("image.publish"):
+            urls = await asyncio.gather(*(
+                publish_image(data, f"image/{fmt}", b64=b64)
+                for (_, fmt, _), (data, b64, _) in zip(jobs, encoded)
+            ))
+
+        variants = [
+            {
+                "kind": kind,
+                "format": fmt,
+                "width": size[0],
+                "height": size[1],
+                "bytes": len(data),
+                "url": url,
+            }
+            for (kind, fmt, _), (data, _, size), url in zip(jobs, encoded, urls)
+        ]
+        full = variants[0]
+        extension = EXTENSIONS[f"image/{image_format}"]
+        filename = f"{slug}_{target}_{uuid.uuid4().hex[:8]}.{extension}"
+        logger.info("Generated image %s (%d bytes, %d variants)", filename, full["bytes"], len(variants))
+        return {
+            "filename": filename,
+            "image_url": full["url"],
+            "width": full["width"],
+            "height": full["height"],
+            "format": image_format,
+            "bytes": full["bytes"],
+            "variants": variants,
         }
-        if seed is not None:
-            # Use seed + idx so each image in a batch is different but reproducible
-            generate_kwargs["seed"] = seed + idx
 
+    async def render(idx: int) -> dict:
+        # Use seed + idx so each image in a batch is different but reproducible
+        image_seed = seed + idx if seed is not None else None
+        async with batch_slots:
+            source = await _generate_single_image(client, image_prompt, native, image_seed)
+
+        with span("image.decode"):
+            (pixels,) = await postprocess(_decode_image, source)
+
+        outputs = await _gather_or_cancel(*(render_output(pixels, target) for target in targets))
+        by_platform = dict(zip(targets, outputs))
+        return {"index": idx, **by_platform[platform_lower], "platforms": by_platform}
+
+    # Finished images are handed over through this queue, not kept as task
+    # results, so nothing here holds on to an image once it has been yielded
+    finished: asyncio.Queue[tuple[int, dict | Exception]] = asyncio.Queue()
+
+    async def attempt(idx: int) -> None:
         try:
-            image_result = await asyncio.to_thread(
-                client.text_to_image,
-                prompt=image_prompt,
-                model=DEFAULT_IMAGE_MODEL,
-                **generate_kwargs,
-            )
-            # HF might return either a PIL Image (if PIL is installed) or raw bytes
-            if not isinstance(image_result, Image.Image):
-                from io import BytesIO
-                image = Image.open(BytesIO(image_result))
-            else:
-                image = image_result
-                
+            result = await render(idx)
         except Exception as e:
-            logger.exception("Hugging Face API inference failed! This is often due to missing HF_API_KEY or model timeouts.")
-            raise e
-
-        # Apply watermark
-        if watermark:
-            image = _apply_watermark(image)
-
-        # Convert the PIL Image to a base64 Data URI instead of saving to disk (serverless-friendly)
-        import base64
-        from io import BytesIO
-        
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        data_uri = f"data:image/png;base64,{img_str}"
-        
-        slug = product_name.replace(" ", "_").lower()
-        filename = f"{slug}_{platform_lower}_{uuid.uuid4().hex[:8]}.png"
-
-        saved_images.append({
-            "index": idx,
-            "filename": filename,
-            "image_url": data_uri,
-        })
-        logger.info("Generated image as base64 payload: %s", filename)
+            result = e
+        finished.put_nowait((idx, result))
+
+    # Fan out the batch and hand each image over as soon as it is done, so it
+    # can be sent and released instead of held until the whole batch finishes
+    tasks = {asyncio.create_task(attempt(idx)) for idx in range(count)}
+    for task in tasks:
+        task.add_done_callback(tasks.discard)
+    errors: dict[int, Exception] = {}
+    try:
+        for _ in range(count):
+            idx, result = await finished.get()
+            if isinstance(result, Exception):
+                logger.error("Image %d/%d of batch failed: %s", idx + 1, count, result)
+                errors[idx] = result
+                yield "image_failed", {"index": idx, "detail": str(result)}
+            else:
+                yield "image", result
+            # Drop this image before waiting for the next one
+            del result
+    finally:
+        # The consumer went away (e.g. the client disconnected): stop the rest
+        for task in list(tasks):
+            task.cancel()
+
+    # Only fail the request if nothing could be generated
+    if len(errors) == count:
+        raise errors[0]
+
+    yield "done", {**summary, "count": count, "failed": sorted(errors)}
+
+
+async def generate_image(product_name: str, style: str, platform: str, **options) -> dict:
+    """
+    Generate social media image(s) and return them all at once.
+
+    Takes the same arguments as `stream_image`. Returns the batch summary
+    with the images in batch order under "images", and the first image's
+    URL as "image_url".
+    """
+    images: list[dict] = []
+    summary: dict = {}
+    async for event, data in stream_image(product_name, style, platform, **options):
+        if event == "image":
+            images.append(data)
+        elif event == "done":
+            summary = data
+    images.sort(key=lambda image: image["index"])
 
     return {
-        "status": "success",
-        "product_name": product_name,
-        "style": style,
-        "platform": platform,
-        "dimensions": dimensions,
-        "image_prompt": image_prompt,
-        "images": saved_images,
+        **summary,
+        "images": images,
         # Convenience: first image URL at top level for backward-compatibility
-        "image_url": saved_images[0]["image_url"] if saved_images else None,
+        "image_url": images[0]["image_url"],
     }
@@ -0,0 +1,284 @@
+"""
+Prism AI — Content-Addressed Image Store
+
+Stores generated images under the SHA-256 of their bytes so they can be
+served from /images/<key> with strong ETags and immutable cache headers,
+instead of being inlined in JSON responses as base64 data URIs.
+
+Backends:
+  - inline: no storage, images are returned as data URIs (default)
+  - local:  files under IMAGE_DIR (/tmp on Vercel), size-bounded LRU eviction
+  - s3:     any S3-compatible bucket (requires boto3)
+
+SeedResultCache reuses the local backend's LRU eviction to keep raw provider
+output for seeded generations, which are deterministic in their inputs.
+"""
+
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from config import (
+    IMAGE_DIR,
+    IMAGE_STORAGE,
+    IMAGE_STORE_MAX_BYTES,
+    S3_BUCKET,
+    S3_ENDPOINT_URL,
+    S3_PREFIX,
+)
+
+logger = logging.getLogger("prism.image_store")
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "webp": "image/webp",
+    "avif": "image/avif",
+}
+EXTENSIONS = {content_type: ext for ext, content_type in CONTENT_TYPES.items()}
+
+# <64 hex chars>.<ext> — anything else is rejected before touching storage
+_KEY_PATTERN = re.compile(r"^[0-9a-f]{64}\.[a-z]+$")
+_SEED_KEY_PATTERN = re.compile(r"^[0-9a-f]{64}\.bin$")
+
+
+def content_key(data: bytes, content_type: str) -> str:
+    """Return the content-addressed key for `data`."""
+    return f"{hashlib.sha256(data).hexdigest()}.{EXTENSIONS[content_type]}"
+
+
+def is_valid_key(key: str) -> bool:
+    return bool(_KEY_PATTERN.match(key)) and key.rsplit(".", 1)[1] in CONTENT_TYPES
+
+
+def content_type_for(key: str) -> str:
+    return CONTENT_TYPES[key.rsplit(".", 1)[1]]
+
+
+# ─── Backends ────────────────────────────────────────────────────────────────
+class ImageStore:
+    """Interface for image storage backends."""
+
+    async def put(self, data: bytes, content_type: str) -> str:
+        """Store `data` and return its key."""
+        raise NotImplementedError
+
+    async def get(self, key: str) -> bytes | None:
+        """Return the stored bytes for `key`, or None if absent."""
+        raise NotImplementedError
+
+
+class LocalImageStore(ImageStore):
+    """
+    Filesystem store with a size cap.
+
+    File mtimes double as recency: writes and reads touch the file, and when
+    the total size exceeds `max_bytes` the least recently used files are
+    deleted first.
+
+    Several workers may share the directory, so any file can disappear
+    between listing and use, and each process's running total misses the
+    others' writes. The total is therefore re-read from disk on every
+    eviction and at least every RESCAN_INTERVAL seconds.
+    """
+
+    RESCAN_INTERVAL = 5.0
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._total_bytes: int | None = None
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+
+    def _stored_files(self) -> list[Path]:
+        return [p for p in self.directory.iterdir() if p.is_file() and is_valid_key(p.name)]
+
+    def _scan(self) -> list[tuple[float, int, Path]]:
+        """(mtime, size, path) of every stored file that still exists."""
+        entries = []
+        for path in self._stored_files():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        self._total_bytes = sum(size for _, size, _ in entries)
+        self._scanned_at = time.monotonic()
+        return entries
+
+    def _put_sync(self, key: str, data: bytes) -> None:
+        path = self.directory / key
+        with self._lock:
+            try:
+                # Same content already stored — just mark it as recently used
+                os.utime(path)
+                return
+            except FileNotFoundError:
+                pass
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if self._total_bytes is None or time.monotonic() - self._scanned_at > self.RESCAN_INTERVAL:
+                self._scan()
+
+            # Write then rename so readers never see a partial file
+            tmp_path = self.directory / f".{key}.{os.getpid()}.tmp"
+            tmp_path.write_bytes(data)
+            tmp_path.replace(path)
+            self._total_bytes += len(data)
+
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        entries = sorted(self._scan(), key=lambda entry: entry[0])
+        for _, size, path in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            # Another worker may have evicted it already; it is gone either way
+            path.unlink(missing_ok=True)
+            self._total_bytes -= size
+            logger.info("Evicted %s from %s (%d bytes)", path.name, self.directory, size)
+
+    def _get_sync(self, key: str) -> bytes | None:
+        path = self.directory / key
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    async def put(self, data: bytes, content_type: str) -> str:
+        key = content_key(data, content_type)
+        await asyncio.to_thread(self._put_sync, key, data)
+        return key
+
+    async def get(self, key: str) -> bytes | None:
+        if not is_valid_key(key):
+            return None
+        return await asyncio.to_thread(self._get_sync, key)
+
+
+class SeedResultCache(LocalImageStore):
+    """
+    Disk cache of raw FLUX output for seeded generations.
+
+    With a fixed seed the result is a function of (prompt, model, width,
+    height, seed), so the provider's response is stored under a hash of those
+    and replayed when the same image is requested again.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        super().__init__(directory, max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def result_key(prompt: str, model: str, width: int, height: int, seed: int) -> str:
+        fields = "\0".join((model, str(width), str(height), str(seed), prompt))
+        return f"{hashlib.sha256(fields.encode()).hexdigest()}.bin"
+
+    def _stored_files(self) -> list[Path]:
+        return [p for p in self.directory.iterdir() if p.is_file() and _SEED_KEY_PATTERN.match(p.name)]
+
+    async def lookup(self, key: str) -> bytes | None:
+        data = await asyncio.to_thread(self._get_sync, key)
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    async def store(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self._put_sync, key, data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "disk",
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class S3ImageStore(ImageStore):
+    """
+    S3-compatible object store (AWS S3, R2, MinIO, ...).
+
+    Size-bounded eviction is delegated to the bucket's lifecycle rules.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str | None = None):
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError("IMAGE_STORAGE=s3 requires the boto3 package.") from e
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _put_sync(self, key: str, data: bytes, content_type: str) -> None:
+        self._client.put_object(
+            Bucket=self.bucket,
+            Key=self.prefix + key,
+            Body=data,
+            ContentType=content_type,
+        )
+
+    def _get_sync(self, key: str) -> bytes | None:
+        try:
+            response = self._client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self._client.exceptions.NoSuchKey:
+            return None
+        return response["Body"].read()
+
+    async def put(self, data: bytes, content_type: str) -> str:
+        key = content_key(data, content_type)
+        await asyncio.to_thread(self._put_sync, key, data, content_type)
+        return key
+
+    async def get(self, key: str) -> bytes | None:
+        if not is_valid_key(key):
+            return None
+        return await asyncio.to_thread(self._get_sync, key)
+
+
+# ─── Factory ─────────────────────────────────────────────────────────────────
+@lru_cache(maxsize=1)
+def get_image_store() -> ImageStore | None:
+    """Return the configured image store, or None for inline data URIs."""
+    if IMAGE_STORAGE == "local":
+        return LocalImageStore(IMAGE_DIR, IMAGE_STORE_MAX_BYTES)
+    if IMAGE_STORAGE == "s3":
+        if not S3_BUCKET:
+            raise ValueError("S3_BUCKET environment variable is not set.")
+        return S3ImageStore(S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL)
+    return None
+
+
+async def publish_image(data: bytes, content_type: str = "image/png", b64: str | None = None) -> str:
+    """
+    Make encoded image bytes available to the client.
+
+    Returns a short /images/<key> URL when a store is configured, or a
+    base64 data URI otherwise. Pass `b64` when the base64 form of `data`
+    was already computed (e.g. in a worker process).
+    """
+    store = get_image_store()
+    if store is None:
+        if b64 is None:
+            b64 = base64.b64encode(data).decode()
+        return f"data:{content_type};base64,{b64}"
+    key = await store.put(data, content_type)
+    return f"/images/{key}"
@@ -5,33 +5,56 @@ Exposes endpoints for blog, video-script, and image generation.
 Serves the frontend SPA at root.
 """
 
+import hmac
+import json
 import logging
 import os
 from pathlib import Path
 from datetime import datetime
 
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 import uuid
 
-from config import VALID_PLATFORMS, VALID_STYLES, RATE_LIMITS
-from blog_generation import generate_blog
-from video_script import generate_video_script
-from image_generation import generate_image, IMAGE_DIR
+from config import (
+    VALID_PLATFORMS,
+    VALID_STYLES,
+    VALID_IMAGE_FORMATS,
+    IMAGE_THUMBNAIL_WIDTHS,
+    RATE_LIMITS,
+    DEFAULT_LLM_MODEL,
+    DEFAULT_IMAGE_MODEL,
+    COALESCE_ENABLED,
+    COALESCE_SCOPE,
+    COALESCE_CHARGE_FOLLOWERS,
+    COALESCE_STREAM_JOIN_SECONDS,
+    WARM_CACHES_ON_STARTUP,
+    TRACING_ENABLED,
+    METRICS_TOKEN,
+    close_clients,
+)
+from blog_generation import generate_blog, stream_blog
+from video_script import generate_video_script, stream_video_script
+from image_generation import generate_image, image_executor, stream_image, supported_formats
+from image_store import get_image_store, content_type_for, is_valid_key
 import database
 from database import init_db, log_usage
 from auth import (
-    get_password_hash, 
-    verify_password, 
+    hash_password_async,
+    verify_password_async,
     create_access_token, 
-    create_refresh_token
+    create_refresh_token,
+    decode_token
 )
+from executors import ExecutorBusy, shutdown_executors
 from middleware import get_current_user, get_rate_limiter
-from models import RegisterRequest, TokenResponse, UserResponse, UserProfileResponse, UsageStats
+from singleflight import SingleFlight, request_key
+from tracing import TracingMiddleware, render_metrics
+from models import RegisterRequest, RefreshRequest, TokenResponse, UserResponse, UserProfileResponse, UsageStats
 import database
 import admin
 
@@ -54,6 +77,28 @@ async def startup_event():
         # We don't raise here so the app can still boot and serve /health
         # Endpoints that require DB will fail gracefully when they try to get a connection
 
+    if database.usage_writer is not None:
+        database.usage_writer.start()
+
+    if WARM_CACHES_ON_STARTUP:
+        # Watermarking runs in image_executor's workers, so their caches are
+        # the ones to warm; starting the pool runs its initializer in each
+        try:
+            await image_executor.start()
+        except Exception as e:
+            logger.warning(f"Could not start the image executor: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Write out any buffered usage events before the pool goes away
+    if database.usage_writer is not None:
+        await database.usage_writer.close()
+    await database.close_pool()
+    shutdown_executors()
+    # Release pooled keep-alive connections held by the provider clients
+    await close_clients()
+
 # CORS — allow all origins during development
 app.add_middleware(
     CORSMiddleware,
@@ -62,12 +107,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Added last so it wraps everything else and times the whole request
+app.add_middleware(TracingMiddleware)
 
 app.include_router(admin.router)
 
-# Serve generated images as static files
-app.mount("/images", StaticFiles(directory=str(IMAGE_DIR)), name="images")
-
 # Resolve frontend directory: check env var first, then relative path
 FRONTEND_DIR = Path(os.getenv("FRONTEND_DIR", Path(__file__).parent.parent / "frontend"))
 
@@ -84,20 +128,149 @@ class BlogRequest(BaseModel):
     product_name: str = Field(..., min_length=1, max_length=100, description="Name of the product")
     tone: str = Field(..., min_length=1, max_length=50, description="Writing tone")
     word_count: int = Field(..., ge=100, le=5000, description="Approximate word count (100-5000)")
+    stream: bool = Field(False, description="Stream the article as Server-Sent Events")
 
 
 class VideoRequest(BaseModel):
     product_name: str = Field(..., min_length=1, max_length=100, description="Name of the product")
     tone: str = Field(..., min_length=1, max_length=50, description="Writing tone")
     duration: int = Field(..., ge=1, le=30, description="Video duration in minutes (1-30)")
+    stream: bool = Field(False, description="Stream the script as Server-Sent Events")
 
 
 class ImageRequest(BaseModel):
     product_name: str = Field(..., min_length=1, max_length=100, description="Name of the product")
     style: VALID_STYLES = Field(..., description="Visual style for the image")
     platform: VALID_PLATFORMS = Field(..., description="Target social media platform")
+    platforms: list[VALID_PLATFORMS] = Field(
+        default_factory=list,
+        max_length=4,
+        description="Extra platforms to size the same images for, without extra generations",
+    )
     seed: int | None = Field(None, description="Optional seed for reproducible generation")
     n: int = Field(1, ge=1, le=4, description="Number of images to generate (1-4)")
+    refresh_prompt: bool = Field(False, description="Bypass the prompt cache and craft a new image prompt")
+    output_format: VALID_IMAGE_FORMATS | None = Field(None, description="Output encoding (defaults to the tier's format)")
+    quality: int | None = Field(None, ge=1, le=100, description="Quality for lossy formats (defaults to the tier's quality)")
+    thumbnails: bool = Field(True, description="Also return downscaled thumbnail variants")
+    stream: bool = Field(False, description="Stream the prompt and each image as Server-Sent Events")
+
+
+# ─── Streaming Helpers ────────────────────────────────────────────────────────
+def _sse_event(event: str, data: dict) -> str:
+    """Format a single Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream_generation(
+    chunks,
+    user_id: str,
+    endpoint: str,
+    result: dict,
+    content_key: str,
+    charge: bool = True,
+) -> StreamingResponse:
+    """
+    Relay LLM text deltas to the client as Server-Sent Events.
+
+    Emits a `delta` event per chunk. Once the stream completes, usage is logged
+    (when `charge` is set) and a `done` event carries the same payload as the
+    non-streaming response. Failures after the response has started are
+    reported as an `error` event.
+    """
+    async def event_source():
+        parts: list[str] = []
+        try:
+            async for text in chunks:
+                parts.append(text)
+                yield _sse_event("delta", {"text": text})
+        except Exception as e:
+            logger.exception("Streaming %s failed", endpoint)
+            yield _sse_event("error", {"detail": str(e)})
+            return
+
+        if charge:
+            await log_usage(user_id, endpoint)
+        yield _sse_event("done", {**result, content_key: "".join(parts)})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        # Disable proxy buffering so deltas reach the browser immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _stream_events(events, user_id: str, endpoint: str, charge: bool = True) -> StreamingResponse:
+    """
+    Relay (event, data) pairs from a generator to the client as Server-Sent Events.
+
+    Usage is logged (when `charge` is set) before the final `done` event is
+    sent. Failures after the response has started are reported as an `error`
+    event.
+    """
+    async def event_source():
+        try:
+            async for event, data in events:
+                if event == "done" and charge:
+                    await log_usage(user_id, endpoint)
+                yield _sse_event(event, data)
+                # Don't keep a sent image alive while waiting for the next event
+                del data
+        except ExecutorBusy:
+            yield _sse_event("error", {"detail": _image_busy().detail})
+        except Exception as e:
+            logger.exception("Streaming %s failed", endpoint)
+            yield _sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ─── Request Coalescing ──────────────────────────────────────────────────────
+generation_flight = SingleFlight(stream_join_seconds=COALESCE_STREAM_JOIN_SECONDS)
+
+
+async def _run_generation(endpoint: str, current_user: dict, params: dict, generate) -> dict:
+    """
+    Run `generate()` and log usage, sharing the upstream call between
+    concurrent identical requests.
+
+    Every caller has already passed its own rate limit. Usage is logged for
+    the caller that made the upstream call, and for callers that joined it
+    when COALESCE_CHARGE_FOLLOWERS is set.
+    """
+    if not COALESCE_ENABLED:
+        result = await generate()
+        await log_usage(current_user["id"], endpoint)
+        return result
+
+    scope = current_user["id"] if COALESCE_SCOPE == "user" else "global"
+    key = request_key(endpoint, scope=scope, **params)
+    result, shared = await generation_flight.do(key, generate)
+    if not shared or COALESCE_CHARGE_FOLLOWERS:
+        await log_usage(current_user["id"], endpoint)
+    return result
+
+
+def _join_stream(endpoint: str, current_user: dict, params: dict, start) -> tuple:
+    """
+    Streaming counterpart of `_run_generation`: concurrent identical requests
+    share one upstream stream from `start()`.
+
+    Returns (stream, charge), where `charge` says whether this caller's usage
+    should be logged once the stream completes.
+    """
+    if not COALESCE_ENABLED:
+        return start(), True
+
+    scope = current_user["id"] if COALESCE_SCOPE == "user" else "global"
+    key = request_key(endpoint, scope=scope, **params)
+    stream, shared = generation_flight.stream(key, start)
+    return stream, not shared or COALESCE_CHARGE_FOLLOWERS
 
 
 # ─── Routes ───────────────────────────────────────────────────────────────────
@@ -119,8 +292,7 @@ async def health():
     # Try to ping the database for a more accurate health check
     db_status = "ok"
     try:
-        pool = await database.get_pool()
-        async with pool.acquire() as conn:
+        async with database.acquire() as conn:
             await conn.execute("SELECT 1")
     except Exception as e:
         db_status = f"unreachable: {str(e)}"
@@ -128,6 +300,58 @@ async def health():
     return {"status": "ok", "database": db_status}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """
+    Request and stage latency histograms in Prometheus text format.
+
+    Closed unless METRICS_TOKEN is set; scrapers send it as a bearer token.
+    """
+    if not TRACING_ENABLED or not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(supplied.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/images/{key}")
+async def get_image(key: str, request: Request):
+    """Serve a stored generated image by its content hash."""
+    store = get_image_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="Image storage is disabled")
+    if not is_valid_key(key):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    # Content-addressed keys never change, so the hash is a strong ETag
+    etag = f'"{key.split(".", 1)[0]}"'
+    cache_headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=cache_headers)
+
+    data = await store.get(key)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return Response(content=data, media_type=content_type_for(key), headers=cache_headers)
+
+
+def _auth_busy() -> HTTPException:
+    """503 for when the password executor is saturated (e.g. a login storm)."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, please try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
+def _image_busy() -> HTTPException:
+    """503 for when the image executor's queue is full."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Image processing is busy, please try again shortly",
+        headers={"Retry-After": "5"},
+    )
+
 @app.post("/auth/register", response_model=TokenResponse)
 async def register(request: RegisterRequest):
     """Register a new user."""
@@ -136,13 +360,15 @@ async def register(request: RegisterRequest):
         raise HTTPException(status_code=400, detail="Email already registered")
         
     user_id = str(uuid.uuid4())
-    hashed_password = get_password_hash(request.password)
+    try:
+        hashed_password = await hash_password_async(request.password)
+    except ExecutorBusy:
+        raise _auth_busy()
     
     user_count = await database.get_user_count()
     role = "admin" if user_count == 0 else "user"
              
-    pool = await database.get_pool()
-    async with pool.acquire() as conn:
+    async with database.acquire() as conn:
          await conn.execute(
              "INSERT INTO users (id, email, name, password_hash, role) VALUES ($1, $2, $3, $4, $5)",
              user_id, request.email, request.name, hashed_password, role
@@ -156,57 +382,125 @@ async def register(request: RegisterRequest):
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """Login to get JWT tokens."""
     user = await database.get_user_by_email(form_data.username) # OAuth2 uses 'username' field for email
-    if not user or not verify_password(form_data.password, user["password_hash"]):
+    valid, new_hash = False, None
+    if user:
+        try:
+            valid, new_hash = await verify_password_async(form_data.password, user["password_hash"])
+        except ExecutorBusy:
+            raise _auth_busy()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
         
-    pool = await database.get_pool()
-    async with pool.acquire() as conn:
-        await conn.execute("UPDATE users SET last_login = $1 WHERE id = $2", datetime.utcnow(), user["id"])
+    # new_hash is set when the stored hash predates the current BCRYPT_ROUNDS
+    async with database.acquire() as conn:
+        await conn.execute(
+            "UPDATE users SET last_login = $1, password_hash = COALESCE($3, password_hash) WHERE id = $2",
+            datetime.utcnow(), user["id"], new_hash,
+        )
         
     access_token = create_access_token(data={"sub": user["id"], "tier": user["tier"]})
     refresh_token = create_refresh_token(data={"sub": user["id"]})
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
-@app.get("/auth/me", response_model=UserProfileResponse)
-async def get_me(current_user: dict = Depends(get_current_user)):
-    """Get current user profile and usage stats."""
-    print(f"DEBUG IN SECURE ROUTE: User id is {current_user['id']}")
-    user_id = current_user["id"]
-    tier = current_user["tier"]
-    limits = RATE_LIMITS.get(tier, RATE_LIMITS["free"])
-    
-    blogs_used = await database.get_today_usage(user_id, "generate-blog")
-    video_used = await database.get_today_usage(user_id, "generate-video-script")
-    image_used = await database.get_today_usage(user_id, "generate-image")
-    
-    usage = UsageStats(
-        blogs_generated=blogs_used,
+@app.post("/auth/refresh", response_model=TokenResponse)
+async def refresh(request: RefreshRequest):
+    """Exchange a refresh token for a new token pair. Each refresh token works once."""
+    invalid_token = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    payload = decode_token(request.refresh_token)
+    if not payload or payload.get("type") != "refresh" or not payload.get("jti"):
+        raise invalid_token
+
+    user = await database.get_auth_user(payload["sub"])
+    if user is None or not user["is_active"]:
+        raise invalid_token
+
+    # Rotation: the presented token is spent whether or not the client gets the reply
+    if not await database.consume_refresh_token(payload["jti"], datetime.utcfromtimestamp(payload["exp"])):
+        logger.warning(f"Reused refresh token rejected for user {user['id']}")
+        raise invalid_token
+
+    access_token = create_access_token(data={"sub": user["id"], "tier": user["tier"]})
+    refresh_token = create_refresh_token(data={"sub": user["id"]})
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+async def _usage_stats(current_user: dict) -> UsageStats:
+    """Today's usage against the user's tier limits, from a single summary query."""
+    limits = RATE_LIMITS.get(current_user["tier"], RATE_LIMITS["free"])
+    used = await database.get_usage_summary(current_user["id"])
+
+    return UsageStats(
+        blogs_generated=used.get("generate-blog", 0),
         blogs_limit=limits.get("generate-blog", 0),
-        video_scripts_generated=video_used,
+        video_scripts_generated=used.get("generate-video-script", 0),
         video_scripts_limit=limits.get("generate-video-script", 0),
-        images_generated=image_used,
+        images_generated=used.get("generate-image", 0),
         images_limit=limits.get("generate-image", 0),
         watermark=limits.get("watermark", True)
     )
-    
+
+@app.get("/auth/me", response_model=UserProfileResponse)
+async def get_me(current_user: dict = Depends(get_current_user)):
+    """Get current user profile and usage stats."""
+    usage = await _usage_stats(current_user)
     return {"user": current_user, "usage": usage}
 
+@app.get("/auth/usage", response_model=UsageStats)
+async def get_usage(current_user: dict = Depends(get_current_user)):
+    """Get today's usage stats only — cheap enough for the frontend to poll."""
+    return await _usage_stats(current_user)
+
 @app.post("/generate-blog", dependencies=[Depends(get_rate_limiter("generate-blog"))])
 async def create_blog(request: BlogRequest, current_user: dict = Depends(get_current_user)):
     """Generate an SEO-optimized blog article."""
+    params = {
+        "product_name": request.product_name,
+        "tone": request.tone,
+        "word_count": request.word_count,
+        "model": DEFAULT_LLM_MODEL,
+    }
+    if request.stream:
+        chunks, charge = _join_stream(
+            "generate-blog",
+            current_user,
+            params,
+            lambda: stream_blog(
+                product_name=request.product_name,
+                tone=request.tone,
+                word_count=request.word_count,
+            ),
+        )
+        return _stream_generation(
+            chunks,
+            user_id=current_user["id"],
+            endpoint="generate-blog",
+            result={
+                "status": "success",
+                "product_name": request.product_name,
+                "tone": request.tone,
+                "word_count": request.word_count,
+            },
+            content_key="generated_blog",
+            charge=charge,
+        )
     try:
-        result = await generate_blog(
-            product_name=request.product_name,
-            tone=request.tone,
-            word_count=request.word_count,
+        return await _run_generation(
+            "generate-blog",
+            current_user,
+            params,
+            lambda: generate_blog(
+                product_name=request.product_name,
+                tone=request.tone,
+                word_count=request.word_count,
+            ),
         )
-        await log_usage(current_user["id"], "generate-blog")
-        limits = RATE_LIMITS.get(current_user["tier"], RATE_LIMITS["free"])
-        return result
     except Exception as e:
         logger.exception("Blog generation failed")
         raise HTTPException(status_code=500, detail=str(e))
@@ -215,14 +509,47 @@ async def create_blog(request: BlogRequest, current_user: dict = Depends(get_cur
 @app.post("/generate-video-script", dependencies=[Depends(get_rate_limiter("generate-video-script"))])
 async def create_video_script(request: VideoRequest, current_user: dict = Depends(get_current_user)):
     """Generate an engaging video script."""
+    params = {
+        "product_name": request.product_name,
+        "tone": request.tone,
+        "duration": request.duration,
+        "model": DEFAULT_LLM_MODEL,
+    }
+    if request.stream:
+        chunks, charge = _join_stream(
+            "generate-video-script",
+            current_user,
+            params,
+            lambda: stream_video_script(
+                product_name=request.product_name,
+                tone=request.tone,
+                duration_mins=request.duration,
+            ),
+        )
+        return _stream_generation(
+            chunks,
+            user_id=current_user["id"],
+            endpoint="generate-video-script",
+            result={
+                "status": "success",
+                "product_name": request.product_name,
+                "tone": request.tone,
+                "duration_mins": request.duration,
+            },
+            content_key="generated_script",
+            charge=charge,
+        )
     try:
-        result = await generate_video_script(
-            product_name=request.product_name,
-            tone=request.tone,
-            duration_mins=request.duration,
+        return await _run_generation(
+            "generate-video-script",
+            current_user,
+            params,
+            lambda: generate_video_script(
+                product_name=request.product_name,
+                tone=request.tone,
+                duration_mins=request.duration,
+            ),
         )
-        await log_usage(current_user["id"], "generate-video-script")
-        return result
     except Exception as e:
         logger.exception("Video script generation failed")
         raise HTTPException(status_code=500, detail=str(e))
@@ -234,17 +561,58 @@ async def create_image(request: ImageRequest, current_user: dict = Depends(get_c
     limits = RATE_LIMITS.get(current_user["tier"], RATE_LIMITS["free"])
     n = min(request.n, limits.get("image_batch_max", 1))
     watermark = limits.get("watermark", True)
+    if request.output_format:
+        image_format = request.output_format
+        if image_format not in supported_formats():
+            raise HTTPException(status_code=400, detail=f"Image format '{image_format}' is not supported on this server")
+    else:
+        # A tier default the server's Pillow build can't encode falls back to PNG
+        image_format = limits.get("image_format", "png")
+        if image_format not in supported_formats():
+            image_format = "png"
+    quality = request.quality or limits.get("image_quality", 90)
+    thumbnail_widths = IMAGE_THUMBNAIL_WIDTHS if request.thumbnails else ()
+    options = dict(
+        seed=request.seed,
+        n=n,
+        watermark=watermark,
+        use_prompt_cache=not request.refresh_prompt,
+        image_format=image_format,
+        quality=quality,
+        thumbnail_widths=thumbnail_widths,
+        platforms=request.platforms,
+    )
+    params = {
+        "product_name": request.product_name,
+        "style": request.style,
+        "platform": request.platform,
+        "platforms": request.platforms,
+        "seed": request.seed,
+        "n": n,
+        "watermark": watermark,
+        "refresh_prompt": request.refresh_prompt,
+        "image_format": image_format,
+        "quality": quality,
+        "thumbnail_widths": thumbnail_widths,
+        "model": DEFAULT_IMAGE_MODEL,
+    }
+    if request.stream:
+        events, charge = _join_stream(
+            "generate-image",
+            current_user,
+            params,
+            lambda: stream_image(request.product_name, request.style, request.platform, **options),
+        )
+        return _stream_events(events, user_id=current_user["id"], endpoint="generate-image", charge=charge)
     try:
-        result = await generate_image(
-            product_name=request.product_name,
-            style=request.style,
-            platform=request.platform,
-            seed=request.seed,
-            n=n,
-            watermark=watermark,
+        return await _run_generation(
+            "generate-image",
+            current_user,
+            params,
+            lambda: generate_image(request.product_name, request.style, request.platform, **options),
         )
-        await log_usage(current_user["id"], "generate-image")
-        return result
+    except ExecutorBusy:
+        raise _image_busy()
     except Exception as e:
         logger.exception("Image generation failed")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,16 +1,24 @@
+import logging
+
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
 from typing import Dict, Any
 
 from auth import decode_token
-from database import get_user_by_id, get_today_usage
+from database import get_auth_user, get_today_usage
 from config import RATE_LIMITS
+from tracing import span
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+logger = logging.getLogger("prism.auth")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 async def get_current_user(request: Request) -> Dict[str, Any]:
+    # Resolve the user at most once per request, whichever dependency asks first
+    cached_user = getattr(request.state, "current_user", None)
+    if cached_user is not None:
+        return cached_user
+
     try:
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -20,33 +28,37 @@ async def get_current_user(request: Request) -> Dict[str, Any]:
         
         auth_header = request.headers.get("Authorization")
         if not auth_header or not auth_header.startswith("Bearer "):
-            print("DEBUG: Missing or invalid Authorization header")
+            logger.debug("Missing or invalid Authorization header")
             raise credentials_exception
             
         token = auth_header.split(" ")[1]
-        print(f"DEBUG: Token starts with: {token[:10]}...")
-        payload = decode_token(token)
+        with span("auth.jwt"):
+            payload = decode_token(token)
         if payload is None:
-            print("DEBUG: decode_token returned None")
+            logger.debug("Token failed verification")
             raise credentials_exception
             
+        # Refresh tokens are only accepted by /auth/refresh
+        if payload.get("type") == "refresh":
+            logger.debug("Refresh token used as access token")
+            raise credentials_exception
+
         user_id: str = payload.get("sub")
         if user_id is None:
-            print("DEBUG: payload missing 'sub'")
+            logger.debug("Token payload missing 'sub'")
             raise credentials_exception
             
-        print(f"DEBUG: Fetching user {user_id}")
-        user = await get_user_by_id(user_id)
+        with span("auth.user"):
+            user = await get_auth_user(user_id)
         if user is None:
-            print("DEBUG: get_user_by_id returned None")
+            logger.debug("No user found for token subject %s", user_id)
             raise credentials_exception
             
         if not user["is_active"]:
-            print("DEBUG: User is not active")
+            logger.debug("User %s is not active", user_id)
             raise credentials_exception
             
-        print(f"DEBUG: User is authenticated {user['email']}")
-        return {
+        request.state.current_user = {
             "id": user["id"],
             "email": user["email"],
             "name": user["name"],
@@ -55,11 +67,12 @@ async def get_current_user(request: Request) -> Dict[str, Any]:
             "is_active": user["is_active"],
             "created_at": user["created_at"]
         }
-    except Exception as e:
-        print(f"DEBUG EXCEPTION in get_current_user: {e}")
-        import traceback
-        traceback.print_exc()
-        raise e
+        return request.state.current_user
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Unexpected error while authenticating request")
+        raise
 
 async def get_admin_user(user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
     if user.get("role") != "admin":
@@ -79,7 +92,8 @@ def get_rate_limiter(endpoint: str):
         if limit is None or str(limit).lower() in ("inf", "unlimited"):
             return user
             
-        usage = await get_today_usage(user["id"], endpoint)
+        with span("quota"):
+            usage = await get_today_usage(user["id"], endpoint)
         if usage >= limit:
             raise HTTPException(
                 status_code=429,
@@ -0,0 +1,120 @@
+"""
+Prism AI — Schema Migrations
+
+Applies the numbered SQL files in migrations/ (NNNN_description.sql) in
+order, recording each one in the schema_version table.
+
+Startup first reads the current version with a single query and returns
+immediately when nothing is pending. Otherwise the run is serialized with
+a Postgres advisory lock so concurrent workers don't race, and each
+migration is applied in its own transaction.
+
+Run `python migrate.py` to apply pending migrations outside of startup.
+"""
+
+import asyncio
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+import asyncpg
+
+logger = logging.getLogger("prism.migrate")
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+# Arbitrary application-wide key for pg_advisory_lock
+_LOCK_KEY = 0x5052_4953_4D00  # "PRISM\0"
+
+_FILENAME_PATTERN = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sql: str
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> list[Migration]:
+    """Read the migration files in version order."""
+    migrations = []
+    for path in sorted(directory.glob("*.sql")):
+        match = _FILENAME_PATTERN.match(path.name)
+        if not match:
+            raise ValueError(f"Invalid migration filename: {path.name}")
+        migrations.append(Migration(int(match.group(1)), match.group(2), path.read_text()))
+
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError("Duplicate migration version numbers.")
+    return migrations
+
+
+async def current_version(conn: asyncpg.Connection) -> int:
+    """Highest applied migration version, 0 for a fresh database."""
+    try:
+        return await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    except asyncpg.UndefinedTableError:
+        return 0
+
+
+async def migrate(conn: asyncpg.Connection) -> list[int]:
+    """Apply any pending migrations and return the versions applied."""
+    migrations = load_migrations()
+    if not migrations:
+        return []
+
+    # Fast path: schema is current, no lock or DDL needed
+    if await current_version(conn) >= migrations[-1].version:
+        return []
+
+    await conn.execute("SELECT pg_advisory_lock($1)", _LOCK_KEY)
+    try:
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # Another worker may have applied some while we waited for the lock
+        version = await current_version(conn)
+
+        applied = []
+        for migration in migrations:
+            if migration.version <= version:
+                continue
+            logger.info("Applying migration %04d_%s", migration.version, migration.name)
+            async with conn.transaction():
+                await conn.execute(migration.sql)
+                await conn.execute(
+                    "INSERT INTO schema_version (version, name) VALUES ($1, $2)",
+                    migration.version, migration.name,
+                )
+            applied.append(migration.version)
+        return applied
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", _LOCK_KEY)
+
+
+async def _main() -> None:
+    from config import DATABASE_URL
+
+    if not DATABASE_URL:
+        raise SystemExit("DATABASE_URL is not set.")
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        applied = await migrate(conn)
+    finally:
+        await conn.close()
+    if applied:
+        print(f"Applied migrations: {', '.join(f'{v:04d}' for v in applied)}")
+    else:
+        print("Schema is up to date.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
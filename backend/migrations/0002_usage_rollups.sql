@@ -0,0 +1,56 @@
+-- Rollups maintained by log_usage alongside usage_logs.
+
+-- Per-day usage so quota checks are a single primary-key lookup
+CREATE TABLE IF NOT EXISTS usage_counters (
+    user_id TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    day DATE NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, endpoint, day),
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+-- Platform-wide rollups for the admin dashboard: all-time totals per
+-- endpoint, and hourly buckets per endpoint and tier (daily = sum of hours)
+CREATE TABLE IF NOT EXISTS usage_totals (
+    endpoint TEXT PRIMARY KEY,
+    count BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS usage_hourly (
+    hour TIMESTAMP NOT NULL,
+    endpoint TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour, endpoint, tier)
+);
+
+-- Backfill from existing logs, unless the rollups are already populated.
+-- Block concurrent inserts so the rebuilt counts are exact.
+LOCK TABLE usage_logs IN SHARE MODE;
+
+INSERT INTO usage_counters (user_id, endpoint, day, count)
+SELECT user_id, endpoint, created_at::date, COUNT(*)
+FROM usage_logs
+WHERE NOT EXISTS (SELECT 1 FROM usage_totals)
+GROUP BY user_id, endpoint, created_at::date
+ON CONFLICT (user_id, endpoint, day)
+DO UPDATE SET count = EXCLUDED.count;
+
+-- Historic rows are attributed to each user's current tier
+INSERT INTO usage_hourly (hour, endpoint, tier, count)
+SELECT date_trunc('hour', l.created_at), l.endpoint, u.tier, COUNT(*)
+FROM usage_logs l
+JOIN users u ON u.id = l.user_id
+WHERE NOT EXISTS (SELECT 1 FROM usage_totals)
+GROUP BY 1, 2, 3
+ON CONFLICT (hour, endpoint, tier)
+DO UPDATE SET count = EXCLUDED.count;
+
+INSERT INTO usage_totals (endpoint, count)
+SELECT endpoint, COUNT(*)
+FROM usage_logs
+WHERE NOT EXISTS (SELECT 1 FROM usage_totals)
+GROUP BY endpoint
+ON CONFLICT (endpoint)
+DO UPDATE SET count = EXCLUDED.count;
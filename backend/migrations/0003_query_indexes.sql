@@ -0,0 +1,13 @@
+-- Indexes for the hot read paths.
+
+-- Per-user usage history by endpoint and time (quota windows, backfills)
+CREATE INDEX IF NOT EXISTS idx_usage_logs_user_endpoint_created
+    ON usage_logs (user_id, endpoint, created_at);
+
+-- Admin user listing: keyset pagination order and email prefix search.
+-- Exact email lookups are already served by the users_email_key unique index.
+CREATE INDEX IF NOT EXISTS idx_users_created_id
+    ON users (created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_users_email_lower_prefix
+    ON users (lower(email) text_pattern_ops);
@@ -0,0 +1,11 @@
+-- One-time-use refresh tokens: a token's jti is recorded here when it is
+-- exchanged, so replaying it fails. Rows are only needed until the token
+-- would have expired anyway and are purged incrementally after that.
+
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti UUID PRIMARY KEY,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at
+    ON revoked_tokens (expires_at);
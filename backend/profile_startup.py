@@ -0,0 +1,102 @@
+"""
+Prism AI — Cold-Start Profiler
+
+Imports the app in fresh interpreters under `python -X importtime`, the way a
+serverless cold start would, and reports where the time goes.
+
+    python profile_startup.py                    # import-time breakdown
+    python profile_startup.py --budget-ms 900    # exit 1 when over budget
+
+The budget check also fails if any module in LAZY_MODULES was imported
+eagerly, since those are meant to load on first use only.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+# Heavy modules that must not be imported just by loading the app
+LAZY_MODULES = ("groq", "huggingface_hub", "PIL", "passlib", "jose", "httpx", "boto3", "redis")
+
+_LINE_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| *(\S+)$")
+
+
+def measure(target: str) -> tuple[float, list[tuple[str, int, int]]]:
+    """
+    Import `target` in a new interpreter.
+
+    Returns (total_ms, rows) where each row is (module, self_us, cumulative_us).
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing {target} failed:\n{result.stderr}")
+
+    rows = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        match = _LINE_PATTERN.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, module = match.groups()
+        rows.append((module, int(self_us), int(cumulative_us)))
+        if module == target:
+            total_us = int(cumulative_us)
+    return total_us / 1000, rows
+
+
+def report(rows: list[tuple[str, int, int]], top: int) -> None:
+    by_package: dict[str, int] = defaultdict(int)
+    for module, self_us, _ in rows:
+        by_package[module.split(".")[0]] += self_us
+
+    print(f"\n{'package':<28}{'self ms':>10}")
+    for package, self_us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"{package:<28}{self_us / 1000:>10.1f}")
+
+    print(f"\n{'module':<48}{'self ms':>10}{'cumul. ms':>11}")
+    for module, self_us, cumulative_us in sorted(rows, key=lambda r: -r[1])[:top]:
+        print(f"{module:<48}{self_us / 1000:>10.1f}{cumulative_us / 1000:>11.1f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="main", help="module to import (default: main)")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters to sample; the fastest counts")
+    parser.add_argument("--top", type=int, default=20, help="rows to show per table")
+    parser.add_argument("--budget-ms", type=float, help="fail when the import takes longer than this")
+    args = parser.parse_args()
+
+    samples = [measure(args.target) for _ in range(max(1, args.runs))]
+    total_ms, rows = min(samples, key=lambda s: s[0])
+
+    report(rows, args.top)
+    print(f"\nimport {args.target}: {total_ms:.1f} ms (best of {len(samples)})")
+
+    imported = {module.split(".")[0] for module, *_ in rows}
+    eager = [module for module in LAZY_MODULES if module in imported]
+    if eager:
+        print(f"Eagerly imported (should be lazy): {', '.join(eager)}")
+
+    if args.budget_ms is not None:
+        if total_ms > args.budget_ms or eager:
+            print(f"FAIL: budget {args.budget_ms:.0f} ms")
+            return 1
+        print(f"OK: within budget {args.budget_ms:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Prism AI — Request Coalescing
+
+Collapses concurrent identical generation requests into a single upstream
+call. The first caller for a key starts the work; callers arriving while it
+is still in flight await the same result (or exception).
+
+Streamed generations are shared the same way: every caller receives the
+items of one upstream stream, and a caller joining late first gets the
+items it missed.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+logger = logging.getLogger("prism.singleflight")
+
+
+def _normalize(value: Any) -> Any:
+    # Collapse whitespace so "Acme  Pro " and "Acme Pro" share a key
+    if isinstance(value, str):
+        return " ".join(value.split())
+    return value
+
+
+def request_key(kind: str, **params: Any) -> str:
+    """Build a stable key from the endpoint name and normalized parameters."""
+    payload = json.dumps(
+        {"kind": kind, **{k: _normalize(v) for k, v in params.items()}},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class _Broadcast:
+    """
+    Fans one upstream async iterator out to any number of subscribers.
+
+    While `replay` is on, every item is kept so that new subscribers start
+    from the beginning. Once it is off, items every subscriber has already
+    received are dropped.
+    """
+
+    def __init__(self, source: AsyncIterator):
+        self.replay = True
+        self._items: list = []
+        self._offset = 0  # position of _items[0] in the stream
+        self._positions: dict[object, int] = {}  # subscriber -> next position
+        self._finished = False
+        self._error: BaseException | None = None
+        self._changed = asyncio.Event()
+        self._task = asyncio.ensure_future(self._pump(source))
+
+    @property
+    def joinable(self) -> bool:
+        return self.replay and not self._task.done() and not self._task.cancelling()
+
+    def add_done_callback(self, callback: Callable[[], None]) -> None:
+        self._task.add_done_callback(lambda _: callback())
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _pump(self, source: AsyncIterator) -> None:
+        try:
+            async for item in source:
+                self._items.append(item)
+                self._notify()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._finished = True
+            self._notify()
+
+    def stop_replay(self) -> None:
+        self.replay = False
+        self._trim()
+
+    def _trim(self) -> None:
+        if self.replay:
+            return
+        end = self._offset + len(self._items)
+        low = min(self._positions.values(), default=end)
+        if low > self._offset:
+            del self._items[: low - self._offset]
+            self._offset = low
+
+    async def subscribe(self) -> AsyncIterator:
+        subscriber = object()
+        position = self._offset
+        self._positions[subscriber] = position
+        try:
+            while True:
+                if position < self._offset + len(self._items):
+                    item = self._items[position - self._offset]
+                    position += 1
+                    self._positions[subscriber] = position
+                    self._trim()
+                    yield item
+                    del item
+                elif self._finished:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                else:
+                    await self._changed.wait()
+        finally:
+            del self._positions[subscriber]
+            self._trim()
+            # Everyone went away (e.g. clients disconnected): stop the upstream
+            if not self._positions and not self._finished:
+                self._task.cancel()
+
+
+class SingleFlight:
+    """Tracks in-flight calls by key so duplicates can share them."""
+
+    def __init__(self, stream_join_seconds: float = 10.0):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._streams: dict[str, _Broadcast] = {}
+        self.stream_join_seconds = stream_join_seconds
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight) + len(self._streams)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """
+        Run `fn` unless a call for `key` is already in flight.
+
+        Returns (result, shared) where `shared` is True for callers that
+        joined an existing call. The call runs as its own task, so a caller
+        disconnecting does not cancel the work for the others.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            logger.info("Coalescing duplicate request %s", key[:12])
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task), False
+
+    def stream(self, key: str, fn: Callable[[], AsyncIterator]) -> tuple[AsyncIterator, bool]:
+        """
+        Subscribe to the stream for `key`, starting `fn()` unless one is
+        already in flight.
+
+        Returns (items, shared) like `do`. Callers can join for
+        `stream_join_seconds` after the stream starts and receive everything
+        sent so far; after that, items are released as soon as every caller
+        has them, and a new identical request starts its own stream. The
+        upstream is cancelled once all callers have gone away.
+        """
+        flight = self._streams.get(key)
+        if flight is not None and flight.joinable:
+            self.coalesced += 1
+            logger.info("Coalescing duplicate stream %s", key[:12])
+            return flight.subscribe(), True
+
+        flight = _Broadcast(fn())
+        self._streams[key] = flight
+        flight.add_done_callback(lambda: self._close_stream(key, flight))
+        asyncio.get_running_loop().call_later(self.stream_join_seconds, self._close_stream, key, flight)
+        return flight.subscribe(), False
+
+    def _close_stream(self, key: str, flight: _Broadcast) -> None:
+        if self._streams.get(key) is flight:
+            del self._streams[key]
+        flight.stop_replay()
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,277 @@
+"""
+Prism AI — Request Tracing & Metrics
+
+Times the stages of a request (token decode, user lookup, quota check,
+provider calls, image post-processing) with `span(name)` blocks:
+
+    with span("groq.blog"):
+        response = await client.chat.completions.create(...)
+
+Each span is recorded twice: against the current request, so
+TracingMiddleware can report it in the `Server-Timing` response header, and
+in a process-wide latency histogram served in Prometheus text format at
+/metrics.
+
+With TRACING_ENABLED=false, `span()` returns a shared no-op context manager
+and the middleware passes requests straight through.
+"""
+
+import math
+import time
+from contextvars import ContextVar
+from threading import Lock
+
+from config import TRACING_ENABLED
+
+# Latency buckets in seconds, from cache hits up to slow provider calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+# ─── Metric Types ────────────────────────────────────────────────────────────
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, total in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, values)} {total:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: dict[tuple, list] = {}
+        self._lock = Lock()
+        _registry.append(self)
+
+    def observe(self, seconds: float, *label_values) -> None:
+        # Index of the first bucket >= seconds; len(buckets) means +Inf
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((values, (list(s[0]), s[1], s[2])) for values, s in self._series.items())
+        for values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == math.inf else f"{bound:g}"
+                labels = _format_labels(self.labels, values, extra=f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {total:.6f}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Gauge:
+    """A value read at scrape time from `collect()`, which maps label values to numbers."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...], collect):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.collect = collect
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        for values, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, values)} {value:g}")
+        return lines
+
+
+_registry: list[Counter | Histogram | Gauge] = []
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines: list[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram(
+    "prism_http_request_duration_seconds",
+    "Time from request start until the response body was sent.",
+    ("method", "route", "status"),
+)
+REQUESTS_TOTAL = Counter(
+    "prism_http_requests_total",
+    "HTTP requests handled.",
+    ("method", "route", "status"),
+)
+STAGE_SECONDS = Histogram(
+    "prism_stage_duration_seconds",
+    "Time spent in each traced request stage.",
+    ("stage",),
+)
+STAGE_ERRORS = Counter(
+    "prism_stage_errors_total",
+    "Traced stages that raised an exception.",
+    ("stage",),
+)
+
+
+# ─── Spans ───────────────────────────────────────────────────────────────────
+# (stage, seconds) pairs for the request being handled. Tasks spawned by the
+# request (asyncio.gather) inherit the same list.
+_request_spans: ContextVar[list[tuple[str, float]] | None] = ContextVar("prism_request_spans", default=None)
+
+
+class _Span:
+    __slots__ = ("name", "_start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        STAGE_SECONDS.observe(elapsed, self.name)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(self.name)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((self.name, elapsed))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str):
+    """Context manager timing one request stage (a no-op when tracing is off)."""
+    if not TRACING_ENABLED:
+        return _NOOP_SPAN
+    return _Span(name)
+
+
+def record_span(name: str, seconds: float) -> None:
+    """Record a stage timed elsewhere (e.g. in a worker process) as if it were a span."""
+    if not TRACING_ENABLED:
+        return
+    STAGE_SECONDS.observe(seconds, name)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+def server_timing_header(spans: list[tuple[str, float]], total: float) -> str:
+    """
+    Format spans as a Server-Timing header value, in first-seen order.
+
+    Repeated stages (e.g. one HF call per image in a batch) are summed.
+    """
+    durations: dict[str, float] = {}
+    for name, seconds in spans:
+        durations[name] = durations.get(name, 0.0) + seconds
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in durations.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+# ─── Middleware ──────────────────────────────────────────────────────────────
+class TracingMiddleware:
+    """
+    ASGI middleware that collects a request's spans and adds Server-Timing.
+
+    The header goes out with the response start, so for streamed responses
+    it only covers the stages that finished before the first byte; later
+    spans still land in the histograms.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        spans: list[tuple[str, float]] = []
+        token = _request_spans.set(spans)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                header = server_timing_header(spans, time.perf_counter() - start)
+                message["headers"] = [*message.get("headers", ()), (b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_spans.reset(token)
+            # Label by route template, not raw path, to keep label cardinality bounded
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or "unmatched"
+            labels = (scope["method"], route_label, str(status_code))
+            REQUEST_SECONDS.observe(time.perf_counter() - start, *labels)
+            REQUESTS_TOTAL.inc(*labels)
@@ -0,0 +1,144 @@
+"""
+Prism AI — Write-Behind Usage Logging
+
+Buffers usage events in memory and writes them to usage_logs in batches
+with COPY, updating the admin rollups in the same transaction. A flush is
+triggered when the buffer reaches `batch_size` or every `flush_interval`
+seconds, and once more on shutdown.
+
+Quota counters (usage_counters) are not deferred: they are shared by every
+worker, so log_usage keeps updating them synchronously and only the audit
+rows and rollups are written behind. Buffering never blocks a request; when
+the buffer is full (e.g. during a database outage) new events are dropped
+and counted in `stats()`.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+
+logger = logging.getLogger("prism.usage_writer")
+
+
+class UsageLogWriter:
+    def __init__(
+        self,
+        acquire,
+        batch_size: int,
+        flush_interval: float,
+        max_buffer: int,
+    ):
+        self._acquire = acquire
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+
+        self._buffer: list[tuple[str, str]] = []
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.flushed = 0
+        self.dropped = 0
+
+    # ─── Lifecycle ───────────────────────────────────────────────────────────
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the background flusher and write out anything still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Usage log flush failed, will retry: {e}")
+
+    # ─── Buffering ───────────────────────────────────────────────────────────
+    def log(self, user_id: str, endpoint: str) -> None:
+        """Buffer one event. Never waits on the database."""
+        if len(self._buffer) >= self.max_buffer:
+            self._drop(1)
+            return
+
+        self._buffer.append((user_id, endpoint))
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    def _drop(self, count: int) -> None:
+        if not self.dropped:
+            logger.warning("Usage log buffer is full (%d events); dropping events", self.max_buffer)
+        self.dropped += count
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+            try:
+                await self._write(batch)
+            except Exception:
+                # Put the batch back in front so nothing is lost on a transient
+                # failure, keeping the newest events if that overfills the buffer
+                self._buffer[:0] = batch
+                overflow = len(self._buffer) - self.max_buffer
+                if overflow > 0:
+                    del self._buffer[:overflow]
+                    self._drop(overflow)
+                raise
+            self.flushed += len(batch)
+
+    async def _write(self, batch: list[tuple[str, str]]) -> None:
+        counts = Counter(batch)
+        async with self._acquire() as conn:
+            async with conn.transaction():
+                # created_at falls back to the column default (flush time)
+                await conn.copy_records_to_table(
+                    "usage_logs",
+                    records=batch,
+                    columns=["user_id", "endpoint"],
+                )
+                await conn.execute('''
+                    WITH batch AS (
+                        SELECT * FROM unnest($1::text[], $2::text[], $3::int[]) AS t(user_id, endpoint, n)
+                    ), hourly AS (
+                        INSERT INTO usage_hourly (hour, endpoint, tier, count)
+                        SELECT date_trunc('hour', LOCALTIMESTAMP), b.endpoint, u.tier, SUM(b.n)
+                        FROM batch b
+                        JOIN users u ON u.id = b.user_id
+                        GROUP BY 1, 2, 3
+                        ON CONFLICT (hour, endpoint, tier)
+                        DO UPDATE SET count = usage_hourly.count + EXCLUDED.count
+                    )
+                    INSERT INTO usage_totals (endpoint, count)
+                    SELECT endpoint, SUM(n) FROM batch
+                    GROUP BY endpoint
+                    ON CONFLICT (endpoint)
+                    DO UPDATE SET count = usage_totals.count + EXCLUDED.count
+                ''',
+                    [user_id for user_id, _ in counts],
+                    [endpoint for _, endpoint in counts],
+                    list(counts.values()),
+                )
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "max_buffer": self.max_buffer,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+        }
@@ -4,33 +4,17 @@ Prism AI — Video Script Generation Module
 Generates structured video scripts using the Groq LLM.
 """
 
-import asyncio
 import logging
+from typing import AsyncIterator
 
-from config import DEFAULT_LLM_MODEL, get_groq_client
+from config import DEFAULT_LLM_MODEL, get_async_groq_client
+from tracing import span
 
 logger = logging.getLogger("prism.video")
 
 
-async def generate_video_script(
-    product_name: str,
-    tone: str,
-    duration_mins: int,
-    model: str = DEFAULT_LLM_MODEL,
-) -> dict:
-    """
-    Generate a video script for a product using Groq API.
-
-    Args:
-        product_name: Name of the product
-        tone:         Writing tone (e.g., Professional, Casual, Energetic)
-        duration_mins: Video duration in minutes
-        model:        LLM model identifier
-
-    Returns:
-        dict with status, metadata, and generated script
-    """
-
+def _build_messages(product_name: str, tone: str, duration_mins: int) -> list[dict]:
+    """Build the chat messages for a video script request."""
     prompt = f"""You are a professional video script writer and content strategist.
 
 Create a highly engaging and structured video script for the following product:
@@ -63,19 +47,40 @@ Outro:
 
 Important: Make sure the script feels natural when spoken aloud and fits within a {duration_mins}-minute video."""
 
+    return [
+        {"role": "system", "content": "You are a professional video script creator."},
+        {"role": "user", "content": prompt},
+    ]
+
+
+async def generate_video_script(
+    product_name: str,
+    tone: str,
+    duration_mins: int,
+    model: str = DEFAULT_LLM_MODEL,
+) -> dict:
+    """
+    Generate a video script for a product using Groq API.
+
+    Args:
+        product_name: Name of the product
+        tone:         Writing tone (e.g., Professional, Casual, Energetic)
+        duration_mins: Video duration in minutes
+        model:        LLM model identifier
+
+    Returns:
+        dict with status, metadata, and generated script
+    """
     logger.info("Generating video script for '%s' (tone=%s, %d min)", product_name, tone, duration_mins)
 
-    client = get_groq_client()
-    response = await asyncio.to_thread(
-        client.chat.completions.create,
-        model=model,
-        messages=[
-            {"role": "system", "content": "You are a professional video script creator."},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.7,
-        max_tokens=2000,
-    )
+    client = get_async_groq_client()
+    with span("groq.video"):
+        response = await client.chat.completions.create(
+            model=model,
+            messages=_build_messages(product_name, tone, duration_mins),
+            temperature=0.7,
+            max_tokens=2000,
+        )
 
     generated_script = response.choices[0].message.content
     logger.info("Video script generated successfully for '%s'", product_name)
@@ -86,4 +91,37 @@ Important: Make sure the script feels natural when spoken aloud and fits within
         "tone": tone,
         "duration_mins": duration_mins,
         "generated_script": generated_script,
-    }
\ No newline at end of file
+    }
+
+
+async def stream_video_script(
+    product_name: str,
+    tone: str,
+    duration_mins: int,
+    model: str = DEFAULT_LLM_MODEL,
+) -> AsyncIterator[str]:
+    """
+    Stream a video script as Groq produces it.
+
+    Same prompt and parameters as `generate_video_script`, but yields the
+    text deltas as they arrive instead of waiting for the full completion.
+    """
+    logger.info("Streaming video script for '%s' (tone=%s, %d min)", product_name, tone, duration_mins)
+
+    client = get_async_groq_client()
+    # Time to first byte from Groq, then the time spent relaying the stream
+    with span("groq.video.connect"):
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=_build_messages(product_name, tone, duration_mins),
+            temperature=0.7,
+            max_tokens=2000,
+            stream=True,
+        )
+
+    with span("groq.video.stream"):
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    logger.info("Video script streamed successfully for '%s'", product_name)
@@ -1,6 +1,8 @@
 // Admin Dashboard Logic
 
 let currentEditUserId = null;
+let usersNextCursor = null;
+const USERS_PAGE_SIZE = 50;
 
 document.addEventListener('DOMContentLoaded', () => {
     // Initialize Theme Toggle
@@ -38,6 +40,18 @@ document.addEventListener('DOMContentLoaded', () => {
     // but let's try to fetch right away.
     fetchStats();
     fetchUsers();
+
+    // Filters reload the list from the first page
+    let filterTimer = null;
+    document.getElementById('filterEmail').addEventListener('input', () => {
+        clearTimeout(filterTimer);
+        filterTimer = setTimeout(() => fetchUsers(), 300);
+    });
+    ['filterTier', 'filterRole', 'filterStatus'].forEach(id => {
+        document.getElementById(id).addEventListener('change', () => fetchUsers());
+    });
+    document.getElementById('userFilters').addEventListener('submit', (e) => e.preventDefault());
+    document.getElementById('loadMoreUsersBtn').addEventListener('click', () => fetchUsers(usersNextCursor));
 });
 
 async function fetchStats() {
@@ -59,19 +73,46 @@ async function fetchStats() {
     }
 }
 
-async function fetchUsers() {
+function buildUsersQuery(cursor) {
+    const params = new URLSearchParams({ limit: USERS_PAGE_SIZE });
+    const email = document.getElementById('filterEmail').value.trim();
+    const tier = document.getElementById('filterTier').value;
+    const role = document.getElementById('filterRole').value;
+    const status = document.getElementById('filterStatus').value;
+
+    if (email) params.set('email_prefix', email);
+    if (tier) params.set('tier', tier);
+    if (role) params.set('role', role);
+    if (status) params.set('is_active', status);
+    if (cursor) params.set('cursor', cursor);
+    return params.toString();
+}
+
+// Without a cursor the table is reset to the first page; with one, the next page is appended
+async function fetchUsers(cursor = null) {
     const tableBody = document.getElementById('usersTableBody');
-    tableBody.innerHTML = '<tr><td colspan="5" class="loading-cell">Loading accounts from database...</td></tr>';
+    const loadMoreBtn = document.getElementById('loadMoreUsersBtn');
+
+    if (cursor) {
+        loadMoreBtn.textContent = 'Loading...';
+        loadMoreBtn.disabled = true;
+    } else {
+        tableBody.innerHTML = '<tr><td colspan="5" class="loading-cell">Loading accounts from database...</td></tr>';
+        loadMoreBtn.style.display = 'none';
+    }
 
     try {
-        const users = await apiGet('/admin/users');
-
-        if (users.length === 0) {
-            tableBody.innerHTML = '<tr><td colspan="5" class="loading-cell">No users found.</td></tr>';
-            return;
+        const page = await apiGet(`/admin/users?${buildUsersQuery(cursor)}`);
+        const users = page.users;
+        usersNextCursor = page.next_cursor;
+
+        if (!cursor) {
+            tableBody.innerHTML = '';
+            if (users.length === 0) {
+                tableBody.innerHTML = '<tr><td colspan="5" class="loading-cell">No users found.</td></tr>';
+            }
         }
 
-        tableBody.innerHTML = '';
         users.forEach(user => {
             const tr = document.createElement('tr');
 
@@ -108,9 +149,18 @@ async function fetchUsers() {
             tableBody.appendChild(tr);
         });
 
+        loadMoreBtn.style.display = usersNextCursor ? '' : 'none';
+
     } catch (error) {
         console.error("Failed to load users:", error);
-        tableBody.innerHTML = '<tr><td colspan="5" class="loading-cell">Failed to load users.</td></tr>';
+        if (cursor) {
+            showToast("Failed to load more users.", "error");
+        } else {
+            tableBody.innerHTML = '<tr><td colspan="5" class="loading-cell">Failed to load users.</td></tr>';
+        }
+    } finally {
+        loadMoreBtn.textContent = 'Load more';
+        loadMoreBtn.disabled = false;
     }
 }
 
@@ -144,12 +194,10 @@ document.getElementById('saveTierBtn').addEventListener('click', async () => {
     btn.disabled = true;
 
     try {
-        const token = localStorage.getItem('prism_access_token');
-        const response = await fetch(`${API_BASE}/admin/users/${currentEditUserId}`, {
+        const response = await authFetch(`${API_BASE}/admin/users/${currentEditUserId}`, {
             method: 'PUT',
             headers: {
-                'Content-Type': 'application/json',
-                'Authorization': `Bearer ${token}`
+                'Content-Type': 'application/json'
             },
             body: JSON.stringify({ tier: newTier, role: newRole, is_active: newStatus })
         });
@@ -178,21 +226,13 @@ document.getElementById('saveTierBtn').addEventListener('click', async () => {
 // (assuming app.js exposes `apiGet` and `showToast` globally from window)
 
 async function apiGet(endpoint) {
-    const token = localStorage.getItem('prism_access_token');
     const API_BASE = window.location.origin;
 
-    const response = await fetch(`${API_BASE}${endpoint}`, {
-        method: 'GET',
-        headers: {
-            'Authorization': `Bearer ${token}`
-        }
+    // authFetch (app.js) refreshes an expired access token and retries once
+    const response = await authFetch(`${API_BASE}${endpoint}`, {
+        method: 'GET'
     });
 
-    if (response.status === 401) {
-        // Let app.js try to handle refresh, but if it fails we just throw
-        throw new Error("401 Unauthorized");
-    }
-
     if (response.status === 403) {
         throw new Error("403 Forbidden");
     }
@@ -18,6 +18,8 @@ let currentUser = null;
 let currentUsage = null;
 let accessToken = localStorage.getItem("prism_access_token");
 let refreshToken = localStorage.getItem("prism_refresh_token");
+// Concurrent 401s share one refresh call, since each refresh token works only once
+let refreshPromise = null;
 
 // ─── Utilities ──────────────────────────────────────────────────────────
 function showLoading(msg = "Loading...") { 
@@ -51,6 +53,12 @@ function downloadImage(url, filename) {
     a.click();
 }
 
+function formatBytes(bytes) {
+    if (bytes < 1024) return `${bytes} B`;
+    if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(0)} KB`;
+    return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+}
+
 async function copyText(text) {
     try {
         await navigator.clipboard.writeText(text);
@@ -160,34 +168,77 @@ $("#image-count").addEventListener("input", (e) => {
 });
 
 // ─── API Call Helper ────────────────────────────────────────────────────
-async function apiPost(endpoint, body, isAuthEndpoint = false) {
-    const headers = { "Content-Type": "application/json" };
+function storeTokens(data) {
+    accessToken = data.access_token;
+    refreshToken = data.refresh_token;
+    localStorage.setItem("prism_access_token", accessToken);
+    localStorage.setItem("prism_refresh_token", refreshToken);
+}
 
-    // Add JWT if it's a protected endpoint
-    if (!isAuthEndpoint && accessToken) {
-        headers["Authorization"] = `Bearer ${accessToken}`;
+async function refreshAccessToken() {
+    // Another tab may already have rotated the tokens
+    const storedRefresh = localStorage.getItem("prism_refresh_token");
+    if (storedRefresh && storedRefresh !== refreshToken) {
+        accessToken = localStorage.getItem("prism_access_token");
+        refreshToken = storedRefresh;
+        return true;
+    }
+    if (!refreshToken) return false;
+
+    if (!refreshPromise) {
+        refreshPromise = (async () => {
+            try {
+                const res = await fetch(`${API_BASE}/auth/refresh`, {
+                    method: "POST",
+                    headers: { "Content-Type": "application/json" },
+                    body: JSON.stringify({ refresh_token: refreshToken }),
+                });
+                if (!res.ok) return false;
+                storeTokens(await res.json());
+                return true;
+            } catch {
+                return false;
+            } finally {
+                refreshPromise = null;
+            }
+        })();
     }
+    return refreshPromise;
+}
 
-    let res = await fetch(`${API_BASE}${endpoint}`, {
-        method: "POST",
-        headers,
-        body: JSON.stringify(body),
+// fetch() with the access token attached; on 401 it refreshes silently and retries once
+async function authFetch(url, options = {}) {
+    const send = () => fetch(url, {
+        ...options,
+        headers: { ...(options.headers || {}), "Authorization": `Bearer ${accessToken}` },
     });
 
-    // Handle token expiry (401)
-    if (res.status === 401 && !isAuthEndpoint && refreshToken) {
-        // Try to refresh
-        try {
-            const refreshRes = await fetch(`${API_BASE}/auth/login`, { // Actually refresh should use form data or similar, for simplicity let's force re-login if 401
-                method: "POST"
-            });
-            // If refresh fails, clear tokens and redirect to login
-            throw new Error("Session expired");
-        } catch {
+    let res = await send();
+    if (res.status === 401) {
+        if (!(await refreshAccessToken())) {
+            logout();
+            throw new Error("Session expired. Please login again.");
+        }
+        res = await send();
+        if (res.status === 401) {
             logout();
             throw new Error("Session expired. Please login again.");
         }
     }
+    return res;
+}
+
+async function apiPost(endpoint, body, isAuthEndpoint = false) {
+    const options = {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(body),
+    };
+
+    // Add JWT if it's a protected endpoint
+    const res = isAuthEndpoint
+        ? await fetch(`${API_BASE}${endpoint}`, options)
+        : await authFetch(`${API_BASE}${endpoint}`, options);
 
     if (!res.ok) {
         const err = await res.json().catch(() => ({ detail: res.statusText }));
@@ -197,15 +248,60 @@ async function apiPost(endpoint, body, isAuthEndpoint = false) {
     return res.json();
 }
 
+// Streams a Server-Sent Events response, calling onEvent(event, data) per message.
+// Resolves with the payload of the final "done" event.
+async function apiStream(endpoint, body, onEvent) {
+    const res = await authFetch(`${API_BASE}${endpoint}`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ ...body, stream: true }),
+    });
+
+    if (!res.ok) {
+        const err = await res.json().catch(() => ({ detail: res.statusText }));
+        throw new Error(err.detail || `Request failed (${res.status})`);
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let result = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE messages are separated by a blank line
+        let sep;
+        while ((sep = buffer.indexOf("\n\n")) !== -1) {
+            const message = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+
+            let event = "message";
+            let data = "";
+            message.split("\n").forEach((line) => {
+                if (line.startsWith("event: ")) event = line.slice(7);
+                else if (line.startsWith("data: ")) data += line.slice(6);
+            });
+            const payload = data ? JSON.parse(data) : {};
+
+            if (event === "error") throw new Error(payload.detail || "Generation failed");
+            if (event === "done") result = payload;
+            onEvent(event, payload);
+        }
+    }
+
+    if (!result) throw new Error("Stream ended unexpectedly");
+    return result;
+}
+
 async function apiGet(endpoint) {
     if (!accessToken) throw new Error("No token");
 
-    const res = await fetch(`${API_BASE}${endpoint}`, {
-        headers: { "Authorization": `Bearer ${accessToken}` },
-    });
+    const res = await authFetch(`${API_BASE}${endpoint}`);
 
     if (!res.ok) {
-        if (res.status === 401) logout();
         throw new Error("Failed to fetch");
     }
 
@@ -334,6 +430,16 @@ async function fetchProfile() {
     }
 }
 
+// Refresh only the usage counters (lighter than re-fetching the whole profile)
+async function refreshUsage() {
+    try {
+        currentUsage = await apiGet("/auth/usage");
+        updateUsageStatsUI();
+    } catch (err) {
+        console.error("Usage refresh failed:", err);
+    }
+}
+
 function logout() {
     accessToken = null;
     refreshToken = null;
@@ -369,11 +475,7 @@ $("#login-form")?.addEventListener("submit", async (e) => {
             throw new Error(err.detail);
         }
 
-        const data = await res.json();
-        accessToken = data.access_token;
-        refreshToken = data.refresh_token;
-        localStorage.setItem("prism_access_token", accessToken);
-        localStorage.setItem("prism_refresh_token", refreshToken);
+        storeTokens(await res.json());
 
         toast("Logged in successfully!", "success");
         await fetchProfile(); // Automatically routes to app
@@ -397,11 +499,7 @@ $("#register-form")?.addEventListener("submit", async (e) => {
     showLoading("Creating account...");
     try {
         const data = await apiPost("/auth/register", { name, email, password }, true);
-
-        accessToken = data.access_token;
-        refreshToken = data.refresh_token;
-        localStorage.setItem("prism_access_token", accessToken);
-        localStorage.setItem("prism_refresh_token", refreshToken);
+        storeTokens(data);
 
         toast("Account created successfully!", "success");
         await fetchProfile();
@@ -438,17 +536,26 @@ $("#blog-form").addEventListener("submit", async (e) => {
 
     showLoading("Drafting Blog Article...");
     try {
-        const data = await apiPost("/generate-blog", { product_name, tone, word_count });
-        lastBlogContent = data.generated_blog;
-
-        // Render the blog content
         const resultEl = $("#blog-result");
-        resultEl.innerHTML = "";
+        let started = false;
+
+        // Render the blog content as it streams in
+        const data = await apiStream("/generate-blog", { product_name, tone, word_count }, (event, payload) => {
+            if (event !== "delta") return;
+            if (!started) {
+                started = true;
+                hideLoading();
+                resultEl.innerHTML = "";
+                resultEl.style.whiteSpace = "pre-wrap";
+            }
+            resultEl.textContent += payload.text;
+        });
+        lastBlogContent = data.generated_blog;
         resultEl.style.whiteSpace = "pre-wrap";
         resultEl.textContent = data.generated_blog;
 
         toast("Blog generated successfully!", "success");
-        await fetchProfile(); // refresh usage stats
+        await refreshUsage();
     } catch (err) {
         toast(`Error: ${err.message}`, "error");
     } finally {
@@ -481,16 +588,25 @@ $("#video-form").addEventListener("submit", async (e) => {
 
     showLoading("Writing Video Script...");
     try {
-        const data = await apiPost("/generate-video-script", { product_name, tone, duration });
-        lastVideoContent = data.generated_script;
-
         const resultEl = $("#video-result");
-        resultEl.innerHTML = "";
+        let started = false;
+
+        const data = await apiStream("/generate-video-script", { product_name, tone, duration }, (event, payload) => {
+            if (event !== "delta") return;
+            if (!started) {
+                started = true;
+                hideLoading();
+                resultEl.innerHTML = "";
+                resultEl.style.whiteSpace = "pre-wrap";
+            }
+            resultEl.textContent += payload.text;
+        });
+        lastVideoContent = data.generated_script;
         resultEl.style.whiteSpace = "pre-wrap";
         resultEl.textContent = data.generated_script;
 
         toast("Video script generated!", "success");
-        await fetchProfile(); // refresh usage stats
+        await refreshUsage();
     } catch (err) {
         toast(`Error: ${err.message}`, "error");
     } finally {
@@ -512,6 +628,33 @@ $("#video-download").addEventListener("click", () => {
 // ─── Image Generation ───────────────────────────────────────────────────
 let lastImageUrls = [];
 
+// Stored images come back as /images/... paths; inline ones as data URIs
+function resolveImageUrl(url) {
+    return url.startsWith("data:") ? url : `${API_BASE}${url}`;
+}
+
+// Gallery <img> that loads a thumbnail variant first; the full-size image is
+// only fetched when opened or downloaded
+function createGalleryImage(img, alt) {
+    const fullUrl = resolveImageUrl(img.image_url);
+    const thumbnails = (img.variants || []).filter((v) => v.kind === "thumbnail");
+
+    const imgEl = document.createElement("img");
+    if (thumbnails.length) {
+        imgEl.src = resolveImageUrl(thumbnails[0].url);
+        imgEl.srcset = thumbnails.map((v) => `${resolveImageUrl(v.url)} ${v.width}w`).join(", ");
+        imgEl.sizes = "(max-width: 600px) 100vw, 50vw";
+    } else {
+        imgEl.src = fullUrl;
+    }
+    imgEl.alt = alt;
+    imgEl.loading = "lazy";
+    if (img.bytes) imgEl.title = `${(img.format || "png").toUpperCase()} · ${formatBytes(img.bytes)}`;
+    // Click to open full-size in new tab
+    imgEl.addEventListener("click", () => window.open(fullUrl, "_blank"));
+    return imgEl;
+}
+
 $("#image-form").addEventListener("submit", async (e) => {
     e.preventDefault();
 
@@ -524,40 +667,48 @@ $("#image-form").addEventListener("submit", async (e) => {
 
     showLoading("Synthesizing Image...");
     try {
-        const data = await apiPost("/generate-image", { product_name, style, platform, n });
-
-        // Store URLs for download
-        lastImageUrls = data.images.map((img) => ({
-            url: img.image_url.startsWith("data:") ? img.image_url : `${API_BASE}${img.image_url}`,
-            filename: img.filename || `generated-${Date.now()}.png`,
-        }));
-
-        // Render images
         const resultEl = $("#image-result");
-        resultEl.innerHTML = "";
-
-        const grid = document.createElement("div");
-        grid.className = "image-grid";
-
-        data.images.forEach((img) => {
-            const imgEl = document.createElement("img");
-            imgEl.src = img.image_url.startsWith("data:") ? img.image_url : `${API_BASE}${img.image_url}`;
-            imgEl.alt = `Generated image for ${product_name}`;
-            imgEl.loading = "lazy";
-            // Click to open full-size in new tab
-            imgEl.addEventListener("click", () => window.open(imgEl.src, "_blank"));
-            grid.appendChild(imgEl);
+        const downloads = [];
+        let slots = [];
+
+        // Images stream in one by one; each fills its placeholder slot
+        const data = await apiStream("/generate-image", { product_name, style, platform, n }, (event, payload) => {
+            if (event === "prompt") {
+                hideLoading();
+                resultEl.innerHTML = "";
+                const grid = document.createElement("div");
+                grid.className = "image-grid";
+                slots = Array.from({ length: payload.count }, () => {
+                    const slot = document.createElement("div");
+                    slot.className = "image-slot loading";
+                    slot.style.aspectRatio = `${payload.dimensions.width} / ${payload.dimensions.height}`;
+                    grid.appendChild(slot);
+                    return slot;
+                });
+                resultEl.appendChild(grid);
+
+                $("#image-prompt-box").classList.remove("hidden");
+                $("#image-prompt-text").textContent = payload.image_prompt;
+            } else if (event === "image") {
+                const slot = slots[payload.index];
+                slot.replaceWith(createGalleryImage(payload, `Generated image for ${product_name}`));
+                downloads[payload.index] = {
+                    url: resolveImageUrl(payload.image_url),
+                    filename: payload.filename || `generated-${Date.now()}.png`,
+                };
+            } else if (event === "image_failed") {
+                slots[payload.index].remove();
+            }
         });
 
-        resultEl.appendChild(grid);
-
-        // Show prompt
-        const promptBox = $("#image-prompt-box");
-        promptBox.classList.remove("hidden");
-        $("#image-prompt-text").textContent = data.image_prompt;
+        // Store URLs for download, in batch order
+        lastImageUrls = downloads.filter(Boolean);
 
+        if (data.failed && data.failed.length) {
+            toast(`${data.failed.length} of ${data.count} images failed to generate.`, "info");
+        }
         toast("Image generated!", "success");
-        await fetchProfile(); // refresh usage stats
+        await refreshUsage();
     } catch (err) {
         toast(`Error: ${err.message}`, "error");
     } finally {